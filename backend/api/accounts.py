@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import record_cache
+from .models import SocialAccount
+
+DISCONNECTED = {'youtube': False, 'twitter': False, 'instagram': False}
+
+
+def _key(user_id):
+    return f"account-flags:{user_id}"
+
+
+def account_flags(user_id):
+    """Connected-platform flags, cached per user until a SocialAccount changes."""
+    flags = cache.get(_key(user_id))
+    record_cache('account_flags', flags is not None)
+    if flags is None:
+        flags = SocialAccount.objects.filter(user_id=user_id).values(
+            'youtube', 'twitter', 'instagram').first() or DISCONNECTED
+        cache.set(_key(user_id), flags, timeout=settings.ACCOUNT_FLAGS_CACHE_TTL)
+    return flags
+
+
+def invalidate_account_flags(user_id):
+    cache.delete(_key(user_id))
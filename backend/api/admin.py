@@ -1,7 +1,11 @@
 from django.contrib import admin
-from .models import TwitterCredential, TwitterStats, SocialAccount
+from .models import AnalyticsSummary, Job, TokenVersion, TwitterCredential, TwitterStats, TwitterStatsRollup, SocialAccount
 
 # Register your models here.
 admin.site.register(SocialAccount)
 admin.site.register(TwitterCredential)
 admin.site.register(TwitterStats)
+admin.site.register(TwitterStatsRollup)
+admin.site.register(AnalyticsSummary)
+admin.site.register(TokenVersion)
+admin.site.register(Job)
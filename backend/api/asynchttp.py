@@ -0,0 +1,20 @@
+"""Shared ``httpx.AsyncClient`` pools for the async views.
+
+An httpx client is bound to the event loop it first ran on, so one client
+per upstream is kept for each running loop and dropped with the loop.
+"""
+import asyncio
+import weakref
+import httpx
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client(name, **options):
+    """Pooled client for upstream ``name`` on the running loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    client = clients.get(name)
+    if client is None:
+        client = clients[name] = httpx.AsyncClient(**options)
+    return client
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .metrics import record_cache
+from .models import TokenVersion
+
+
+def _key(user_id):
+    return f"token-version:{user_id}"
+
+
+def token_version(user_id):
+    """Current token version, served from the cache after the first lookup."""
+    version = cache.get(_key(user_id))
+    record_cache('token_version', version is not None)
+    if version is None:
+        version = TokenVersion.objects.filter(user_id=user_id).values_list(
+            'version', flat=True).first() or 0
+        cache.set(_key(user_id), version, timeout=settings.TOKEN_VERSION_CACHE_TTL)
+    return version
+
+
+def bump_token_version(user_id):
+    """Revoke all of the user's outstanding access and refresh tokens."""
+    TokenVersion.objects.get_or_create(user_id=user_id)
+    TokenVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    cache.delete(_key(user_id))
+
+
+def add_user_claims(token, user):
+    token['username'] = user.username
+    token['email'] = user.email
+    token['is_active'] = user.is_active
+    token['ver'] = token_version(user.id)
+    return token
+
+
+def tokens_for_user(user):
+    """Refresh token (and derived access token) carrying the user claims."""
+    return add_user_claims(RefreshToken.for_user(user), user)
+
+
+def check_token_version(token):
+    if token['ver'] != token_version(token[api_settings.USER_ID_CLAIM]):
+        raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if 'ver' in refresh:
+            try:
+                check_token_version(refresh)
+            except AuthenticationFailed as e:
+                raise InvalidToken(e.detail)
+        return super().validate(attrs)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that builds ``request.user`` from the token claims.
+
+    The user is an unsaved-looking ``User`` with only id, username, email
+    and is_active filled in. That is enough for ownership filters, but not
+    for writes: views that save the user must load it first. Tokens
+    without claims, issued before this scheme, fall back to the usual
+    database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if 'ver' not in validated_token:
+            return super().get_user(validated_token)
+        if not validated_token.get('is_active', False):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        check_token_version(validated_token)
+        user = User(
+            id=validated_token[api_settings.USER_ID_CLAIM],
+            username=validated_token['username'],
+            email=validated_token.get('email', ''),
+            is_active=True,
+        )
+        user._state.adding = False
+        user._state.db = 'default'
+        return user
+
+
+class StreamJWTAuthentication(ClaimsJWTAuthentication):
+    """Also accepts the access token as ``?token=``, since EventSource cannot set headers."""
+
+    def authenticate(self, request):
+        if self.get_header(request) is not None:
+            return super().authenticate(request)
+        raw_token = request.query_params.get('token')
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token.encode())
+        return self.get_user(validated_token), validated_token
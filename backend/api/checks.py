@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Revocation, quotas, breakers and locks need a cache every process sees."""
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        "The default cache is local to each process, so token revocation, quotas, "
+        "circuit breakers and single-flight locks are not shared between server "
+        "workers, the refreshers and the job worker.",
+        hint="Set REDIS_URL to a Redis server shared by every process.",
+        id='api.W001',
+    )]
@@ -0,0 +1,70 @@
+"""Circuit breakers for upstream APIs, one per provider and endpoint.
+
+Breaker state lives in the cache, so all worker processes share it (given a
+shared ``CACHE_BACKEND``). After ``CIRCUIT_FAILURE_THRESHOLD`` failures
+within ``CIRCUIT_FAILURE_WINDOW`` seconds the breaker opens, and calls fail
+fast with ``CircuitOpen`` for ``CIRCUIT_OPEN_SECONDS``. After that one trial
+call is let through: success closes the breaker, failure opens it again.
+"""
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is unavailable; retry in {retry_after:.0f}s.")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _name(provider, path):
+    return f"{provider}:{metrics.endpoint_label(path)}"
+
+
+def before_call(provider, path):
+    """Raise ``CircuitOpen`` unless a call to this endpoint may go ahead."""
+    name = _name(provider, path)
+    open_until = cache.get(f"circuit:{name}:open")
+    if open_until is None:
+        return
+    remaining = open_until - time.time()
+    # Half-open: once the wait is over, a single trial call at a time
+    if remaining > 0 or not cache.add(f"circuit:{name}:trial", 1,
+                                      timeout=settings.CIRCUIT_OPEN_SECONDS):
+        metrics.circuit_rejections.inc(provider, metrics.endpoint_label(path))
+        raise CircuitOpen(name, max(remaining, 1))
+
+
+def record_success(provider, path):
+    name = _name(provider, path)
+    if cache.get(f"circuit:{name}:open") is not None:
+        cache.delete_many([f"circuit:{name}:open", f"circuit:{name}:trial",
+                           f"circuit:{name}:failures"])
+
+
+def record_failure(provider, path):
+    name = _name(provider, path)
+    failures_key = f"circuit:{name}:failures"
+    cache.add(failures_key, 0, timeout=settings.CIRCUIT_FAILURE_WINDOW)
+    try:
+        failures = cache.incr(failures_key)
+    except ValueError:
+        # Window expired between add and incr
+        cache.set(failures_key, 1, timeout=settings.CIRCUIT_FAILURE_WINDOW)
+        failures = 1
+    trial_failed = cache.get(f"circuit:{name}:open") is not None
+    if failures >= settings.CIRCUIT_FAILURE_THRESHOLD or trial_failed:
+        open_seconds = settings.CIRCUIT_OPEN_SECONDS
+        cache.set(f"circuit:{name}:open", time.time() + open_seconds,
+                  timeout=open_seconds + settings.CIRCUIT_FAILURE_WINDOW)
+        cache.delete_many([f"circuit:{name}:trial", failures_key])
+        metrics.circuit_opened.inc(provider, metrics.endpoint_label(path))
+
+
+# For coroutines: the cache backend may block or touch the database
+abefore_call = sync_to_async(before_call)
+arecord_success = sync_to_async(record_success)
+arecord_failure = sync_to_async(record_failure)
@@ -0,0 +1,37 @@
+import hashlib
+from rest_framework.response import Response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+
+def make_etag(*parts):
+    """Strong ETag from the parts that identify one version of a payload."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response if the client's validators still match, else ``None``.
+
+    Only the version stamp is needed, so callers can answer before building
+    the payload. ``If-None-Match`` takes precedence over ``If-Modified-Since``.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # Weak comparison: compression middleware may have weakened our tag
+        etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        matched = '*' in etags or etag in etags
+    else:
+        since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        matched = since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+    if not matched:
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user data: browsers may keep it but must revalidate every time
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,180 @@
+"""Database-backed job queue: no broker, ``run_jobs`` workers poll the ``Job`` table.
+
+A job is claimed with a conditional ``UPDATE ... WHERE status = 'pending'``,
+so any number of worker processes can poll the same table without running a
+job twice. At most one job per user and kind is pending at a time.
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+import tweepy
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job, TwitterCredential, TwitterStats
+
+logger = logging.getLogger(__name__)
+
+TWITTER_CONNECT = 'twitter_connect'
+TWITTER_REFRESH = 'twitter_refresh'
+
+
+class PermanentJobError(Exception):
+    """A failure that retrying will not fix."""
+
+
+def enqueue(user_id, kind, payload=None):
+    """Pending job for ``(user, kind)``, created unless one is already waiting.
+
+    Returns ``(job, created)``. A job that is already waiting takes the
+    newer payload.
+    """
+    payload = payload or {}
+    try:
+        with transaction.atomic():
+            return Job.objects.create(user_id=user_id, kind=kind, payload=payload), True
+    except IntegrityError:
+        pass
+    job = Job.objects.filter(user_id=user_id, kind=kind, status=Job.PENDING).first()
+    if job is None:
+        # Claimed by a worker in between: this request needs a fresh run
+        return enqueue(user_id, kind, payload)
+    if payload and job.payload != payload:
+        Job.objects.filter(pk=job.pk, status=Job.PENDING).update(payload=payload)
+        job.payload = payload
+    return job, False
+
+
+def claim(worker):
+    """Atomically take the oldest runnable job, or ``None`` if there is none."""
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.PENDING, run_after__lte=now).order_by(
+        'run_after', 'id').values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING, worker=worker, started_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _finish(job, status, result=None, error=''):
+    # The payload may hold credentials: drop it once the job is done
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        status=status, result=result, error=error, payload={}, finished_at=timezone.now())
+
+
+def _retry(job, error):
+    """Put the job back in the queue; ``False`` if a newer pending job supersedes it."""
+    try:
+        with transaction.atomic():
+            return bool(Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+                status=Job.PENDING, error=error, worker='',
+                run_after=timezone.now() + timedelta(seconds=settings.JOB_RETRY_DELAY * job.attempts)))
+    except IntegrityError:
+        return False
+
+
+def run(job):
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise PermanentJobError(f"Unknown job kind {job.kind!r}.")
+        result = handler(job)
+    except Exception as e:
+        retryable = not isinstance(e, PermanentJobError) and job.attempts < settings.JOB_MAX_ATTEMPTS
+        logger.warning(f'[jobs] {job} attempt {job.attempts} failed: {e}')
+        if not (retryable and _retry(job, str(e))):
+            _finish(job, Job.FAILED, error=str(e))
+        return
+    _finish(job, Job.SUCCEEDED, result=result)
+
+
+def requeue_orphans(timeout=None):
+    """Recover jobs left ``running`` by a worker that died mid-job."""
+    if timeout is None:
+        timeout = settings.JOB_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    recovered = 0
+    for job in Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff):
+        if job.attempts < settings.JOB_MAX_ATTEMPTS and _retry(job, 'Worker timed out.'):
+            recovered += 1
+        else:
+            _finish(job, Job.FAILED, error='Worker timed out.')
+    return recovered
+
+
+def work(worker=None, poll_interval=None, once=False):
+    """Run jobs until interrupted, or until the queue is drained when ``once``."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    while True:
+        job = claim(worker)
+        if job is not None:
+            run(job)
+            continue
+        if once:
+            return
+        requeue_orphans()
+        time.sleep(poll_interval)
+
+
+def _twitter_api(access_token, access_token_secret):
+    auth = tweepy.OAuth1UserHandler(
+        settings.TWITTER_API_KEY, settings.TWITTER_API_SECRET, access_token, access_token_secret)
+    return tweepy.API(auth)
+
+
+def _verify(access_token, access_token_secret):
+    try:
+        return _twitter_api(access_token, access_token_secret).verify_credentials()
+    except (tweepy.Unauthorized, tweepy.Forbidden) as e:
+        raise PermanentJobError(str(e)) from e
+
+
+def _record_stats(user_id, twitter_user):
+    TwitterStats.objects.create(
+        user_id=user_id,
+        followers_count=twitter_user.followers_count,
+        tweets_count=twitter_user.statuses_count,
+        likes_count=twitter_user.favourites_count,
+    )
+    return {
+        "followers_count": twitter_user.followers_count,
+        "tweets_count": twitter_user.statuses_count,
+        "likes_count": twitter_user.favourites_count,
+    }
+
+
+def connect_twitter(job):
+    access_token = job.payload['access_token']
+    access_token_secret = job.payload['access_token_secret']
+    twitter_user = _verify(access_token, access_token_secret)
+    TwitterCredential.objects.update_or_create(
+        user_id=job.user_id,
+        defaults={
+            "access_token": access_token,
+            "access_token_secret": access_token_secret,
+            "twitter_username": twitter_user.screen_name,
+        },
+    )
+    return {"message": "Twitter account connected and stats saved successfully.",
+            "twitter_username": twitter_user.screen_name, **_record_stats(job.user_id, twitter_user)}
+
+
+def refresh_twitter(job):
+    try:
+        creds = TwitterCredential.objects.get(user_id=job.user_id)
+    except TwitterCredential.DoesNotExist:
+        raise PermanentJobError("Twitter not connected.")
+    twitter_user = _verify(creds.access_token, creds.access_token_secret)
+    return {"message": "Stats refreshed successfully.", **_record_stats(job.user_id, twitter_user)}
+
+
+HANDLERS = {
+    TWITTER_CONNECT: connect_twitter,
+    TWITTER_REFRESH: refresh_twitter,
+}
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from benchmarks.harness import (
+    ENDPOINTS, format_report, run_endpoint, seed_users, test_database, upstream_settings,
+)
+from benchmarks.upstreams import start_upstreams
+
+
+class Command(BaseCommand):
+    help = ("Load-test the API endpoints against local stand-ins for Twitter and Google: "
+            "p50/p95/p99 latency, throughput and queries per request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--latency-ms', type=float, default=50)
+        parser.add_argument('--jitter-ms', type=float, default=10)
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            choices=[name for name, _, _ in ENDPOINTS],
+                            help="Only run these endpoints (repeatable).")
+
+    def handle(self, *args, **options):
+        selected = [e for e in ENDPOINTS if not options['endpoints'] or e[0] in options['endpoints']]
+        twitter, google = start_upstreams(options['latency_ms'], options['jitter_ms'], options['error_rate'])
+        try:
+            with test_database(), upstream_settings(twitter, google):
+                users = seed_users(options['users'])
+                results = {}
+                for name, method, path in selected:
+                    results[name] = run_endpoint(method, path, users, options['requests'],
+                                                 options['concurrency'])
+                self.stdout.write(format_report(results))
+                self.stdout.write(f"upstream requests: {twitter.config.requests}")
+        finally:
+            twitter.stop()
+            google.stop()
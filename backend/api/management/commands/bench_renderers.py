@@ -0,0 +1,75 @@
+import gzip
+import time
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from api.renderers import FastJSONRenderer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def twitter_history(rows):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return {"connected": True, "next": None, "data": [
+        {
+            "title": "socialsync",
+            "followers_count": 1000 + i,
+            "tweets_count": 500 + i // 3,
+            "likes_count": 2000 + i * 2,
+            "timestamp": (start + timedelta(hours=i)).strftime("%Y-%m-%d"),
+        } for i in range(rows)
+    ]}
+
+
+def youtube_trends(days):
+    start = datetime(2025, 1, 1).date()
+    series = lambda k: [{"date": (start + timedelta(days=i)).isoformat(), "value": i * k}
+                        for i in range(days)]
+    return {
+        "channel": {"title": "SocialSync", "subscribers": 12345, "views": 987654,
+                    "videoCount": 42, "description": "Channel description " * 5},
+        "videos": [{"title": f"Video {i}", "views": "1000", "likes": "50", "comments": "7"}
+                   for i in range(5)],
+        "trends": {"subscribers": series(3), "views": series(40), "engagement": series(5)},
+        "last_refreshed": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def cpu_ms(fn, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        result = fn()
+    return (time.process_time() - started) / iterations * 1000, result
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON rendering and compression: bytes and CPU time per response."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        payloads = {
+            'twitter status, 100 rows': twitter_history(100),
+            'twitter status, 5000 rows': twitter_history(5000),
+            'youtube stats, 30 days': youtube_trends(30),
+            'youtube stats, 365 days': youtube_trends(365),
+        }
+        for name, payload in payloads.items():
+            self.stdout.write(name)
+            for label, renderer in (('stdlib json', JSONRenderer()),
+                                    ('FastJSONRenderer', FastJSONRenderer())):
+                ms, body = cpu_ms(lambda: renderer.render(payload), iterations)
+                self.stdout.write(f"  {label:<18} {len(body):>9} B {ms:8.3f} ms")
+            encoders = [('gzip', lambda: compress_string(body, max_random_bytes=100)),
+                        ('gzip level 1', lambda: gzip.compress(body, compresslevel=1))]
+            if brotli is not None:
+                encoders.append(('brotli q5', lambda: brotli.compress(body, quality=5)))
+            for label, encode in encoders:
+                ms, compressed = cpu_ms(encode, iterations)
+                self.stdout.write(f"  + {label:<16} {len(compressed):>9} B {ms:8.3f} ms")
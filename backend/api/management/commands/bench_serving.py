@@ -0,0 +1,120 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from benchmarks.harness import percentile, seed_users, test_database
+from benchmarks.upstreams import upstreams_process
+
+SERVERS = {
+    # What docker-compose ran before: Django's threaded WSGI server
+    'wsgi': lambda port: [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}',
+                          '--noreload', '--skip-checks'],
+    'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'backend.asgi:application',
+                          '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, env):
+    port = free_port()
+    process = subprocess.Popen(SERVERS[kind](port), cwd=settings.BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"The {kind} server exited with status {process.returncode}.")
+        try:
+            httpx.get(f"{url}/metrics", timeout=1)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise CommandError(f"The {kind} server did not start listening.")
+
+
+async def dashboard_load(http, token):
+    """What the dashboard page fires on open with a refresh: three requests at once."""
+    headers = {'Authorization': f'Bearer {token}'}
+    started = time.perf_counter()
+    responses = await asyncio.gather(
+        http.get('/api/dashboard/', headers=headers),
+        http.post('/youtube/stats/', headers=headers),
+        http.post('/twitter/stats/', headers=headers),
+        return_exceptions=True)
+    ok = all(not isinstance(r, Exception) and r.status_code < 400 for r in responses)
+    return time.perf_counter() - started, ok
+
+
+async def run_level(url, tokens, clients, loads):
+    """``clients`` concurrent users each opening the dashboard ``loads`` times in a row."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as http:
+        async def user(i):
+            token = tokens[i % len(tokens)]
+            return [await dashboard_load(http, token) for _ in range(loads)]
+
+        started = time.perf_counter()
+        batches = await asyncio.gather(*(user(i) for i in range(clients)))
+        wall = time.perf_counter() - started
+    results = [result for batch in batches for result in batch]
+    latencies = sorted(r[0] * 1000 for r in results)
+    return {
+        'loads': len(results),
+        'errors': sum(1 for r in results if not r[1]),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.fmean(latencies),
+        'throughput': len(results) / wall,
+    }
+
+
+class Command(BaseCommand):
+    help = ("Compare the WSGI and ASGI servers under concurrent dashboard users, "
+            "with Twitter and Google answered by local stand-ins.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, nargs='+', default=[100, 500, 1000],
+                            help="Concurrent users per run.")
+        parser.add_argument('--loads', type=int, default=3, help="Dashboard loads per user.")
+        parser.add_argument('--users', type=int, default=100, help="Seeded accounts to spread users over.")
+        parser.add_argument('--latency-ms', type=float, default=50)
+        parser.add_argument('--jitter-ms', type=float, default=10)
+        parser.add_argument('--server', action='append', dest='servers', choices=list(SERVERS),
+                            help="Only run these servers (repeatable).")
+
+    def handle(self, *args, **options):
+        servers = options['servers'] or list(SERVERS)
+        with upstreams_process(options['latency_ms'], options['jitter_ms']) as (twitter_url, google_url), \
+                test_database() as database:
+            tokens = [token for _, token in seed_users(options['users'], history=24)]
+            connections.close_all()
+            env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+                   'BENCH_DATABASE': database, 'BENCH_TWITTER_URL': twitter_url,
+                   'BENCH_GOOGLE_URL': google_url}
+            self.stdout.write(f"{'server':<7} {'clients':>8} {'loads':>7} {'err':>5} {'p50 ms':>9} "
+                              f"{'p95 ms':>9} {'p99 ms':>9} {'loads/s':>9}")
+            for kind in servers:
+                process, url = start_server(kind, env)
+                try:
+                    for clients in options['clients']:
+                        r = asyncio.run(run_level(url, tokens, clients, options['loads']))
+                        self.stdout.write(
+                            f"{kind:<7} {clients:>8} {r['loads']:>7} {r['errors']:>5} {r['p50']:>9.1f} "
+                            f"{r['p95']:>9.1f} {r['p99']:>9.1f} {r['throughput']:>9.1f}")
+                finally:
+                    process.terminate()
+                    process.wait()
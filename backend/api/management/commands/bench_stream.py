@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import httpx
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import connections
+from api.summary import update_summary
+from benchmarks.harness import percentile, seed_users, test_database
+from .bench_serving import start_server
+
+
+async def subscribe(http, token, received, ready):
+    """Follow one stats stream, noting when each follower count arrives."""
+    async with http.stream('GET', '/api/stats/stream/', params={'token': token}) as response:
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith('event: '):
+                event = line[7:]
+            elif line.startswith('data: ') and event == 'snapshot':
+                ready.release()
+            elif line.startswith('data: ') and event == 'delta':
+                followers = json.loads(line[6:]).get('twitter', {}).get('followers')
+                if followers is not None:
+                    received[followers] = time.perf_counter()
+
+
+async def run(url, seeded, subscribers, updates, rate):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as http:
+        received, ready = {}, asyncio.Semaphore(0)
+        streams = [asyncio.create_task(subscribe(http, seeded[i % len(seeded)][1], received, ready))
+                   for i in range(subscribers)]
+        for _ in streams:
+            await ready.acquire()
+        # Written from this process, so the server only sees them by polling
+        written = {}
+        for n in range(updates):
+            followers = 10 ** 6 + n
+            user, _ = random.choice(seeded)
+            await sync_to_async(update_summary)(user.id, twitter_followers=followers)
+            written[followers] = time.perf_counter()
+            await asyncio.sleep(1 / rate)
+        await asyncio.sleep(2)
+        for task in streams:
+            task.cancel()
+        await asyncio.gather(*streams, return_exceptions=True)
+    # With several subscribers per user, the first arrival counts
+    latencies = sorted((received[f] - at) * 1000 for f, at in written.items() if f in received)
+    return written, latencies
+
+
+class Command(BaseCommand):
+    help = ("Measure how fast summary changes written by another process reach "
+            "subscribers of the ASGI stats stream.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=200)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--updates', type=int, default=200)
+        parser.add_argument('--rate', type=float, default=20, help="Summary writes per second.")
+
+    def handle(self, *args, **options):
+        with test_database() as database:
+            seeded = seed_users(options['users'], history=1)
+            connections.close_all()
+            env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+                   'BENCH_DATABASE': database,
+                   # No upstream is called: summaries are written directly
+                   'BENCH_TWITTER_URL': 'http://127.0.0.1:9', 'BENCH_GOOGLE_URL': 'http://127.0.0.1:9'}
+            process, url = start_server('asgi', env)
+            try:
+                written, latencies = asyncio.run(run(
+                    url, seeded, options['subscribers'], options['updates'], options['rate']))
+            finally:
+                process.terminate()
+                process.wait()
+        self.stdout.write(f"{options['subscribers']} subscribers over {options['users']} users, "
+                          f"{len(written)} changes at {options['rate']:g}/s")
+        self.stdout.write(f"delivered {len(latencies)}/{len(written)}")
+        if latencies:
+            self.stdout.write(
+                f"latency ms: p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+                f"p99 {percentile(latencies, 99):.1f}  mean {statistics.fmean(latencies):.1f}")
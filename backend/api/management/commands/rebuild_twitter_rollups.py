@@ -0,0 +1,13 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild Twitter growth rollups from the stored TwitterStats history."
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(twitterstats__isnull=False).distinct()
+        for user in users:
+            rebuild_rollups(user)
+        self.stdout.write(f"Rebuilt rollups for {users.count()} user(s).")
@@ -0,0 +1,28 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from twitter_api import tokens as twitter_tokens
+from youtube_api import tokens as youtube_tokens
+
+
+class Command(BaseCommand):
+    help = "Refresh YouTube and Twitter OAuth tokens shortly before they expire."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=settings.OAUTH_REFRESH_INTERVAL,
+            help="Seconds between refresh passes.")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Run a single refresh pass and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            for name, manager in (('YouTube', youtube_tokens), ('Twitter', twitter_tokens)):
+                refreshed, failed = manager.refresh_expiring()
+                if refreshed or failed:
+                    self.stdout.write(
+                        f"{name}: refreshed {refreshed} token(s), {failed} failed.")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
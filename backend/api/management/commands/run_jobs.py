@@ -0,0 +1,38 @@
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (Twitter connect/refresh) in worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.JOB_WORKERS,
+            help="Worker processes polling the queue.")
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+            help="Seconds an idle worker waits before polling again.")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue has no runnable jobs.")
+
+    def handle(self, *args, **options):
+        work_options = {'poll_interval': options['poll_interval'], 'once': options['once']}
+        if options['workers'] <= 1:
+            jobs.work(**work_options)
+            return
+        # Children must open their own database connections
+        connections.close_all()
+        processes = [multiprocessing.Process(target=jobs.work, kwargs=work_options, daemon=True)
+                     for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,169 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms live in this process's memory, so each server
+process exposes its own series on ``/metrics``. Recording a sample is a
+dict lookup and a few additions under a lock.
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_id_segment = re.compile(r'/\d{3,}(?=/|$)')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        registry.append(self)
+
+    def label_string(self, labels, extra=()):
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            lines.extend(self.sample_lines(labels, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def sample_lines(self, labels, value):
+        return [f'{self.name}{self.label_string(labels)} {value}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def sample_lines(self, labels, state):
+        counts, count, total = state
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{self.label_string(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{self.name}_bucket{self.label_string(labels, [("le", "+Inf")])} {count}')
+        lines.append(f'{self.name}_sum{self.label_string(labels)} {total}')
+        lines.append(f'{self.name}_count{self.label_string(labels)} {count}')
+        return lines
+
+
+registry = []
+
+upstream_latency = Histogram(
+    'socialsync_upstream_request_seconds', 'Latency of calls to upstream APIs.',
+    ('provider', 'endpoint'))
+upstream_requests = Counter(
+    'socialsync_upstream_requests_total', 'Calls to upstream APIs by response status.',
+    ('provider', 'endpoint', 'status'))
+view_latency = Histogram(
+    'socialsync_view_seconds', 'Time spent handling a request, per view.', ('view',))
+view_queries = Histogram(
+    'socialsync_view_db_queries', 'Database queries issued per request, per view.', ('view',),
+    buckets=QUERY_COUNT_BUCKETS)
+view_db_time = Histogram(
+    'socialsync_view_db_seconds', 'Time spent in the database per request, per view.', ('view',))
+singleflight_calls = Counter(
+    'socialsync_singleflight_calls_total',
+    'Coalesced calls by role: leader ran it, shared waited in-process, remote waited on another process.',
+    ('flight', 'role'))
+circuit_opened = Counter(
+    'socialsync_circuit_opened_total', 'Times an upstream circuit breaker opened.',
+    ('provider', 'endpoint'))
+circuit_rejections = Counter(
+    'socialsync_circuit_rejections_total', 'Upstream calls refused by an open circuit breaker.',
+    ('provider', 'endpoint'))
+cache_lookups = Counter(
+    'socialsync_cache_lookups_total', 'Cache lookups by cache and result (hit or miss).',
+    ('cache', 'result'))
+
+
+def endpoint_label(path):
+    """URL path with numeric ids collapsed, to keep label cardinality bounded."""
+    return _id_segment.sub('/:id', path)
+
+
+def observe_upstream(provider, path, status, seconds):
+    endpoint = endpoint_label(path)
+    upstream_latency.observe(seconds, provider, endpoint)
+    upstream_requests.inc(provider, endpoint, str(status))
+
+
+def record_cache(name, hit):
+    cache_lookups.inc(name, 'hit' if hit else 'miss')
+
+
+def hit_ratio_lines():
+    caches = {}
+    with cache_lookups.lock:
+        for (name, result), value in cache_lookups.values.items():
+            caches.setdefault(name, {})[result] = value
+    lines = ['# HELP socialsync_cache_hit_ratio Share of cache lookups served from the cache.',
+             '# TYPE socialsync_cache_hit_ratio gauge']
+    for name, counts in sorted(caches.items()):
+        total = counts.get('hit', 0) + counts.get('miss', 0)
+        if total:
+            lines.append(f'socialsync_cache_hit_ratio{{cache="{name}"}} {counts.get("hit", 0) / total:.4f}')
+    return lines
+
+
+def render():
+    from youtube_api.services import get_service
+    # The service skeleton cache is an lru_cache: copy its own counters
+    info = get_service.cache_info()
+    cache_lookups.set(info.hits, 'youtube_service', 'hit')
+    cache_lookups.set(info.misses, 'youtube_service', 'miss')
+    lines = []
+    for metric in registry:
+        lines.extend(metric.expose())
+    lines.extend(hit_ratio_lines())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,146 @@
+import re
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    brotli = None
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+re_accepts_br = re.compile(r'\bbr\b')
+
+
+class QueryStats:
+    """``execute_wrapper`` hook counting and timing the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# Under ASGI the ORM runs in worker threads with their own connections;
+# they find the request's QueryStats through this context variable.
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def _count_in_context(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    connection.execute_wrappers.append(_count_in_context)
+
+
+class MetricsMiddleware:
+    """Record latency, query count and database time per resolved view."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        self.observe(request, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryStats()
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.observe(request, time.perf_counter() - started, queries)
+        return response
+
+    def observe(self, request, elapsed, queries):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.view_latency.observe(elapsed, view)
+        metrics.view_queries.observe(queries.count, view)
+        metrics.view_db_time.observe(queries.seconds, view)
+
+
+class CompressionMiddleware:
+    """Compress responses above ``RESPONSE_COMPRESSION_MIN_SIZE`` bytes.
+
+    Brotli is preferred when the client accepts it and the ``brotli``
+    package is installed; otherwise gzip, with the same random padding
+    Django's GZipMiddleware adds against BREACH.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        if (response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and re_accepts_br.search(accept_encoding):
+            compressed = brotli.compress(
+                response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+            encoding = 'br'
+        elif re_accepts_gzip.search(accept_encoding):
+            compressed = compress_string(response.content, max_random_bytes=100)
+            encoding = 'gzip'
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is no longer byte-identical to the entity
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_remove_youtubestats_social_account_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwitterStatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'day'), ('week', 'week'), ('month', 'month'), ('quarter', 'quarter')], max_length=8)),
+                ('period_start', models.DateField()),
+                ('first_followers', models.IntegerField()),
+                ('last_followers', models.IntegerField()),
+                ('first_tweets', models.IntegerField()),
+                ('last_tweets', models.IntegerField()),
+                ('first_likes', models.IntegerField()),
+                ('last_likes', models.IntegerField()),
+                ('samples', models.IntegerField(default=0)),
+                ('first_recorded_at', models.DateTimeField()),
+                ('last_recorded_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'period_start'), name='unique_twitter_rollup')],
+            },
+        ),
+    ]
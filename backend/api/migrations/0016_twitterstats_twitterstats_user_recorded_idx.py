@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_twitterstatsrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='twitterstats',
+            index=models.Index(fields=['user', 'recorded_at', 'id'], name='twitterstats_user_recorded_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_twitterstats_twitterstats_user_recorded_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('youtube_subscribers', models.BigIntegerField(default=0)),
+                ('youtube_views', models.BigIntegerField(default=0)),
+                ('youtube_likes', models.BigIntegerField(default=0)),
+                ('youtube_comments', models.BigIntegerField(default=0)),
+                ('youtube_refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('twitter_followers', models.BigIntegerField(default=0)),
+                ('twitter_tweets', models.BigIntegerField(default=0)),
+                ('twitter_impressions', models.BigIntegerField(default=0)),
+                ('twitter_likes', models.BigIntegerField(default=0)),
+                ('twitter_retweets', models.BigIntegerField(default=0)),
+                ('twitter_refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('total_views', models.BigIntegerField(default=0)),
+                ('total_likes', models.BigIntegerField(default=0)),
+                ('engagement', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 
@@ -22,6 +22,13 @@ def create_social_account(sender, instance, created, **kwargs):
         SocialAccount.objects.create(user=instance)
 
 
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def invalidate_social_account_cache(sender, instance, **kwargs):
+    from .accounts import invalidate_account_flags
+    invalidate_account_flags(instance.user_id)
+
+
 class TwitterCredential(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     twitter_username = models.CharField(max_length=255)
@@ -40,5 +47,204 @@ class TwitterStats(models.Model):
     likes_count = models.IntegerField()
     recorded_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recorded_at', 'id'],
+                         name='twitterstats_user_recorded_idx'),
+        ]
+
     def __str__(self):
         return f"Stats for {self.user.username} at {self.recorded_at}"
+
+
+class TwitterStatsRollup(models.Model):
+    """First/last TwitterStats values per user for each day, week, month and quarter."""
+    PERIODS = ['day', 'week', 'month', 'quarter']
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    period = models.CharField(max_length=8, choices=[(p, p) for p in PERIODS])
+    period_start = models.DateField()
+    first_followers = models.IntegerField()
+    last_followers = models.IntegerField()
+    first_tweets = models.IntegerField()
+    last_tweets = models.IntegerField()
+    first_likes = models.IntegerField()
+    last_likes = models.IntegerField()
+    samples = models.IntegerField(default=0)
+    first_recorded_at = models.DateTimeField()
+    last_recorded_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'period', 'period_start'], name='unique_twitter_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.period} from {self.period_start}"
+
+
+@receiver(post_save, sender=TwitterStats)
+def update_twitter_rollups(sender, instance, created, **kwargs):
+    # The summary's Twitter fields belong to the OAuth2 sync (twitter_api.sync);
+    # subscribers still hear of the new history row
+    if created:
+        from .push import publish
+        from .rollups import record_snapshot
+        record_snapshot(instance)
+        publish(instance.user_id, {'twitter_history': {
+            'followers': instance.followers_count,
+            'tweets': instance.tweets_count,
+            'likes': instance.likes_count,
+            'recorded_at': instance.recorded_at.isoformat(),
+        }})
+
+
+class AnalyticsSummary(models.Model):
+    """Per-user cross-platform totals, kept current by the ingestion paths."""
+    YOUTUBE_FIELDS = ['youtube_subscribers', 'youtube_views', 'youtube_likes',
+                      'youtube_comments', 'youtube_refreshed_at']
+    TWITTER_FIELDS = ['twitter_followers', 'twitter_tweets', 'twitter_impressions',
+                      'twitter_likes', 'twitter_retweets', 'twitter_refreshed_at']
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    youtube_subscribers = models.BigIntegerField(default=0)
+    youtube_views = models.BigIntegerField(default=0)
+    youtube_likes = models.BigIntegerField(default=0)
+    youtube_comments = models.BigIntegerField(default=0)
+    youtube_refreshed_at = models.DateTimeField(null=True, blank=True)
+    twitter_followers = models.BigIntegerField(default=0)
+    twitter_tweets = models.BigIntegerField(default=0)
+    twitter_impressions = models.BigIntegerField(default=0)
+    twitter_likes = models.BigIntegerField(default=0)
+    twitter_retweets = models.BigIntegerField(default=0)
+    twitter_refreshed_at = models.DateTimeField(null=True, blank=True)
+    total_views = models.BigIntegerField(default=0)
+    total_likes = models.BigIntegerField(default=0)
+    engagement = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Analytics summary for {self.user.username}"
+
+    def recompute_totals(self):
+        self.total_views = self.youtube_views + self.twitter_impressions
+        self.total_likes = self.youtube_likes + self.twitter_likes
+        self.engagement = self.total_likes + self.youtube_comments + self.twitter_retweets
+
+    def as_payload(self):
+        return {
+            "total_views": self.total_views,
+            "total_likes": self.total_likes,
+            "engagement": self.engagement,
+            "youtube": {
+                "subscribers": self.youtube_subscribers,
+                "views": self.youtube_views,
+                "likes": self.youtube_likes,
+                "comments": self.youtube_comments,
+                "last_refreshed": self.youtube_refreshed_at.isoformat() if self.youtube_refreshed_at else None,
+            },
+            "twitter": {
+                "followers": self.twitter_followers,
+                "tweets": self.twitter_tweets,
+                "impressions": self.twitter_impressions,
+                "likes": self.twitter_likes,
+                "retweets": self.twitter_retweets,
+                "last_refreshed": self.twitter_refreshed_at.isoformat() if self.twitter_refreshed_at else None,
+            },
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class StatsEvent(models.Model):
+    """A change to a user's AnalyticsSummary, fanned out to push subscribers.
+
+    ``changes`` holds only the fields that changed, shaped like
+    ``AnalyticsSummary.as_payload()``. Rows are kept for a few minutes,
+    long enough for every server process to pick them up.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    changes = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='statsevent_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats change #{self.id} for {self.user_id}"
+
+
+class TokenVersion(models.Model):
+    """Bumping ``version`` revokes every JWT issued to the user before."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} token version {self.version}"
+
+
+# Copied into the token claims, plus the password: changing any revokes the user's tokens
+TOKEN_FIELDS = ('username', 'email', 'is_active', 'password')
+
+
+@receiver(pre_save, sender=User)
+def note_token_field_changes(sender, instance, update_fields=None, **kwargs):
+    instance._revoke_tokens = False
+    if instance.pk is None or (update_fields is not None and not set(update_fields) & set(TOKEN_FIELDS)):
+        return
+    old = User.objects.filter(pk=instance.pk).values(*TOKEN_FIELDS).first()
+    instance._revoke_tokens = old is not None and any(
+        old[name] != getattr(instance, name) for name in TOKEN_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_of_changed_user(sender, instance, created, **kwargs):
+    if not created and instance._revoke_tokens:
+        from .authentication import bump_token_version
+        bump_token_version(instance.id)
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``run_jobs`` workers."""
+    PENDING, RUNNING, SUCCEEDED, FAILED = 'pending', 'running', 'succeeded', 'failed'
+    STATUSES = [(s, s) for s in (PENDING, RUNNING, SUCCEEDED, FAILED)]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=64, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Repeated requests collapse into the job that has not started yet
+            models.UniqueConstraint(fields=['user', 'kind'], condition=models.Q(status='pending'),
+                                    name='job_one_pending_per_user_kind'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'id'], name='job_status_run_after_idx'),
+        ]
+
+    def as_payload(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error or None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} for {self.user_id} ({self.status})"
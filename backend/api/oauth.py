@@ -0,0 +1,42 @@
+"""Background refresh of the stored OAuth tokens of every provider app."""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_backoff(failures):
+    """Seconds to wait after ``failures`` failed refreshes in a row."""
+    return min(settings.OAUTH_REFRESH_MAX_BACKOFF, settings.OAUTH_REFRESH_INTERVAL * 2 ** failures)
+
+
+def refresh_expiring(queryset, expiry_field, refresh, provider, margin=None):
+    """Call ``refresh`` on every token in ``queryset`` that expires within ``margin`` seconds.
+
+    ``expiry_field`` names the model's expiry column. Tokens whose last
+    refreshes failed wait out their backoff first. Returns ``(refreshed,
+    failed)``.
+    """
+    margin = settings.OAUTH_REFRESH_MARGIN if margin is None else margin
+    now = timezone.now()
+    cutoff = now + timedelta(seconds=margin)
+    refreshed, failed = 0, 0
+    pending = queryset.exclude(refresh_token__isnull=True).exclude(refresh_token='').filter(
+        Q(**{f'{expiry_field}__isnull': True}) | Q(**{f'{expiry_field}__lte': cutoff})).filter(
+        Q(refresh_retry_at__isnull=True) | Q(refresh_retry_at__lte=now))
+    for token in pending:
+        try:
+            refresh(token)
+            refreshed += 1
+        except Exception as e:
+            failed += 1
+            delay = refresh_backoff(token.refresh_failures + 1)
+            queryset.filter(pk=token.pk).update(
+                refresh_failures=token.refresh_failures + 1,
+                refresh_retry_at=now + timedelta(seconds=delay))
+            logger.error(f'[refresh_expiring] {provider} token refresh failed for user {token.user_id}, '
+                         f'retrying in {delay}s: {e}')
+    return refreshed, failed
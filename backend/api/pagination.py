@@ -0,0 +1,71 @@
+import base64
+from datetime import datetime, time, timedelta
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def encode_cursor(stat):
+    raw = f"{stat.recorded_at.isoformat()}|{stat.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        recorded_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(recorded_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidQuery("Invalid 'after' cursor.")
+
+
+def parse_bound(value, name, end=False):
+    """Accept an ISO datetime or date; a bare ``to`` date covers the whole day."""
+    try:
+        # Well-formed but impossible values, e.g. 2025-02-30, raise ValueError.
+        # Dates go first: parse_datetime() reads a bare date as midnight.
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if moment is None:
+        if day is None:
+            raise InvalidQuery(f"Invalid '{name}' value: {value}")
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+        if end:
+            moment -= timedelta(microseconds=1)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_limit(value, default, maximum):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidQuery("'limit' must be an integer.")
+    if limit < 1:
+        raise InvalidQuery("'limit' must be positive.")
+    return min(limit, maximum)
+
+
+def keyset_page(queryset, after=None, limit=None):
+    """Slice ``queryset`` after a ``(recorded_at, id)`` cursor, oldest rows first.
+
+    Without a cursor the first page holds the oldest rows; bound the range
+    with ``from`` to start later. Returns the page rows and the cursor for the next page, or ``None``
+    when this is the last page.
+    """
+    if after:
+        recorded_at, pk = decode_cursor(after)
+        queryset = queryset.filter(
+            Q(recorded_at__gt=recorded_at) | Q(recorded_at=recorded_at, id__gt=pk))
+    rows = list(queryset.order_by('recorded_at', 'id')[:limit + 1])
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
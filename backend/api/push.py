@@ -0,0 +1,180 @@
+"""Push channel for stats changes, served as server-sent events.
+
+``update_summary()`` records every change to a user's summary as a
+``StatsEvent`` row, and so does every new ``TwitterStats`` history row,
+whichever process wrote it: a view, the job worker or the YouTube
+refresher. Each server process runs one poller per event loop
+that reads the new rows for the users it has subscribers for and hands
+them to their queues, so there is no broker to run. Writes made in the
+same process wake the poller as soon as they commit; the others are seen
+within ``STATS_STREAM_POLL_INTERVAL``.
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from collections import defaultdict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import AnalyticsSummary, StatsEvent
+
+logger = logging.getLogger(__name__)
+
+_hubs = weakref.WeakKeyDictionary()
+_hubs_lock = threading.Lock()
+
+
+def payload_delta(before, after):
+    """The entries of ``after`` that differ from ``before``, nested dicts compared per key."""
+    delta = {}
+    for key, value in after.items():
+        if isinstance(value, dict):
+            changed = payload_delta(before.get(key) or {}, value)
+            if changed:
+                delta[key] = changed
+        elif before.get(key) != value:
+            delta[key] = value
+    return delta
+
+
+def publish(user_id, changes):
+    """Record a summary change for the user's subscribers; call inside the writing transaction."""
+    StatsEvent.objects.create(user_id=user_id, changes=changes)
+    StatsEvent.objects.filter(
+        user_id=user_id,
+        created_at__lt=timezone.now() - timedelta(seconds=settings.STATS_EVENT_RETENTION),
+    ).delete()
+    transaction.on_commit(wake_pollers)
+
+
+def wake_pollers():
+    with _hubs_lock:
+        hubs = list(_hubs.items())
+    for loop, hub in hubs:
+        try:
+            loop.call_soon_threadsafe(hub.wakeup.set)
+        except RuntimeError:
+            # The loop has been closed
+            pass
+
+
+def latest_event_id():
+    return StatsEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def events_since(last_id, user_ids):
+    """``(newest id, [(user_id, changes), ...])`` for the given users' events after ``last_id``."""
+    newest = latest_event_id()
+    if newest <= last_id:
+        return last_id, []
+    events = StatsEvent.objects.filter(
+        id__gt=last_id, id__lte=newest, user_id__in=user_ids,
+    ).order_by('id').values_list('user_id', 'changes')
+    return newest, list(events)
+
+
+class Hub:
+    """Subscriber queues of one event loop and the poller feeding them."""
+
+    def __init__(self):
+        self.queues = defaultdict(set)
+        self.wakeup = asyncio.Event()
+        self.started = asyncio.Event()
+        self.poller = None
+        self.last_id = None
+
+    async def subscribe(self, user_id):
+        queue = asyncio.Queue(settings.STATS_STREAM_QUEUE_SIZE)
+        self.queues[user_id].add(queue)
+        if self.poller is None:
+            self.poller = asyncio.create_task(self.poll())
+        # Anything committed after this point reaches the queue
+        try:
+            await self.started.wait()
+        except BaseException:
+            self.unsubscribe(user_id, queue)
+            raise
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.queues.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.queues[user_id]
+
+    def deliver(self, user_id, changes):
+        for queue in self.queues.get(user_id, ()):
+            try:
+                queue.put_nowait(changes)
+            except asyncio.QueueFull:
+                # Too far behind: drop the backlog and resend the whole summary
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def poll(self):
+        try:
+            while self.queues:
+                self.wakeup.clear()
+                try:
+                    if self.last_id is None:
+                        self.last_id = await sync_to_async(latest_event_id)()
+                        self.started.set()
+                    self.last_id, events = await sync_to_async(events_since)(
+                        self.last_id, list(self.queues))
+                    for user_id, changes in events:
+                        self.deliver(user_id, changes)
+                except Exception as e:
+                    logger.error(f'[push] Polling stats events failed: {e}', exc_info=True)
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), settings.STATS_STREAM_POLL_INTERVAL)
+                except TimeoutError:
+                    pass
+        finally:
+            self.poller = None
+            self.last_id = None
+            self.started.clear()
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    with _hubs_lock:
+        hub = _hubs.get(loop)
+        if hub is None:
+            hub = _hubs[loop] = Hub()
+    return hub
+
+
+def frame(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+async def current_summary(user_id):
+    summary = await AnalyticsSummary.objects.filter(user_id=user_id).afirst()
+    return (summary or AnalyticsSummary(user_id=user_id)).as_payload()
+
+
+async def stream(user_id):
+    """Event stream for one subscriber: the full summary, then a delta per change."""
+    hub = get_hub()
+    queue = await hub.subscribe(user_id)
+    try:
+        yield frame('snapshot', await current_summary(user_id))
+        while True:
+            try:
+                changes = await asyncio.wait_for(queue.get(), settings.STATS_STREAM_KEEPALIVE)
+            except TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield b': keepalive\n\n'
+                continue
+            if changes is None:
+                yield frame('snapshot', await current_summary(user_id))
+            else:
+                yield frame('delta', changes)
+    finally:
+        hub.unsubscribe(user_id, queue)
@@ -0,0 +1,69 @@
+import time
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_lock = threading.Lock()
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, api, retry_after):
+        super().__init__(f"Upstream quota for {api} exhausted; retry in {retry_after:.0f}s.")
+        self.api = api
+        self.retry_after = retry_after
+
+
+def _bucket_key(api, scope, user_id):
+    return f"quota:{api}:app" if scope == 'app' else f"quota:{api}:user:{user_id}"
+
+
+def _available(key, capacity, period, now):
+    tokens, updated = cache.get(key, (capacity, now))
+    return min(capacity, tokens + (now - updated) * capacity / period)
+
+
+def charge(api, user_id, cost=1, priority=INTERACTIVE):
+    """Take ``cost`` units from the app-wide and per-user buckets of ``api``.
+
+    Buckets are configured in ``UPSTREAM_QUOTAS`` as ``(capacity, seconds
+    to refill fully)`` and refill continuously. Background work may not dip
+    into the last ``QUOTA_INTERACTIVE_RESERVE`` share of a bucket, which is
+    kept for users waiting on a response. Raises ``QuotaExceeded`` without
+    charging anything when a bucket cannot cover the call.
+
+    State lives in the default cache: the lock makes charging exact within a
+    process, while across processes sharing a cache it is best effort.
+    """
+    budgets = settings.UPSTREAM_QUOTAS.get(api)
+    if not budgets:
+        return
+    now = time.time()
+    with _lock:
+        balances = []
+        for scope, (capacity, period) in budgets.items():
+            key = _bucket_key(api, scope, user_id)
+            tokens = _available(key, capacity, period, now)
+            floor = capacity * settings.QUOTA_INTERACTIVE_RESERVE if priority == BACKGROUND else 0
+            if tokens - cost < floor:
+                raise QuotaExceeded(api, (floor + cost - tokens) * period / capacity)
+            balances.append((key, tokens - cost, period))
+        for key, tokens, period in balances:
+            cache.set(key, (tokens, now), timeout=period)
+
+
+async def acharge(api, user_id, cost=1, priority=INTERACTIVE):
+    """``charge`` for coroutines: the cache calls run in a worker thread."""
+    await sync_to_async(charge)(api, user_id, cost, priority)
+
+
+def remaining(api, user_id=None):
+    """Current balance of each bucket for ``api``, for monitoring."""
+    now = time.time()
+    return {
+        scope: _available(_bucket_key(api, scope, user_id), capacity, period, now)
+        for scope, (capacity, period) in settings.UPSTREAM_QUOTAS.get(api, {}).items()
+    }
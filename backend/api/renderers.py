@@ -0,0 +1,38 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by orjson when it is installed.
+
+    Datetimes and any other types orjson does not handle natively are passed
+    to DRF's encoder, so the output matches the stdlib renderer. Indented
+    output, payloads orjson rejects and installs without orjson use the
+    stdlib path.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(
+                accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data, default=self.encoder.default,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            # e.g. non-string keys or integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class EventStreamRenderer(FastJSONRenderer):
+    """Lets ``Accept: text/event-stream`` through negotiation; errors go out as an ``error`` event."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'event: error\ndata: ' + super().render(data) + b'\n\n'
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import TwitterStats, TwitterStatsRollup
+
+METRICS = ['followers', 'tweets', 'likes']
+
+
+def period_start(day, period):
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def previous_period_start(start, period):
+    return period_start(start - timedelta(days=1), period)
+
+
+def _locked_rollup(user_id, period, start):
+    return TwitterStatsRollup.objects.select_for_update().filter(
+        user_id=user_id, period=period, period_start=start).first()
+
+
+def record_snapshot(stats):
+    """Fold one TwitterStats row into its day/week/month/quarter rollups."""
+    day = timezone.localdate(stats.recorded_at)
+    values = {
+        'followers': stats.followers_count,
+        'tweets': stats.tweets_count,
+        'likes': stats.likes_count,
+    }
+    with transaction.atomic():
+        for period in TwitterStatsRollup.PERIODS:
+            start = period_start(day, period)
+            rollup = _locked_rollup(stats.user_id, period, start)
+            if rollup is None:
+                try:
+                    with transaction.atomic():
+                        TwitterStatsRollup.objects.create(
+                            user_id=stats.user_id, period=period, period_start=start,
+                            first_recorded_at=stats.recorded_at,
+                            last_recorded_at=stats.recorded_at, samples=1,
+                            **{f'first_{m}': v for m, v in values.items()},
+                            **{f'last_{m}': v for m, v in values.items()},
+                        )
+                    continue
+                except IntegrityError:
+                    # A concurrent refresher opened the period first: fold into its row
+                    rollup = _locked_rollup(stats.user_id, period, start)
+            if stats.recorded_at < rollup.first_recorded_at:
+                rollup.first_recorded_at = stats.recorded_at
+                for metric, value in values.items():
+                    setattr(rollup, f'first_{metric}', value)
+            if stats.recorded_at >= rollup.last_recorded_at:
+                rollup.last_recorded_at = stats.recorded_at
+                for metric, value in values.items():
+                    setattr(rollup, f'last_{metric}', value)
+            rollup.samples += 1
+            rollup.save()
+
+
+def rebuild_rollups(user):
+    TwitterStatsRollup.objects.filter(user=user).delete()
+    for stats in TwitterStats.objects.filter(user=user).order_by('recorded_at'):
+        record_snapshot(stats)
+
+
+def growth(user, today=None):
+    """Growth in the current day, week, month and quarter, from one rollup query.
+
+    A window's growth is its latest value minus the closing value of the
+    previous period. When there is no previous period, its own first value
+    is used instead.
+    """
+    today = today or timezone.localdate()
+    wanted = Q()
+    for period in TwitterStatsRollup.PERIODS:
+        start = period_start(today, period)
+        wanted |= Q(period=period, period_start__in=[
+            start, previous_period_start(start, period)])
+    rollups = {
+        (r.period, r.period_start): r
+        for r in TwitterStatsRollup.objects.filter(wanted, user=user)
+    }
+
+    result = {}
+    for period in TwitterStatsRollup.PERIODS:
+        start = period_start(today, period)
+        current = rollups.get((period, start))
+        previous = rollups.get((period, previous_period_start(start, period)))
+        if current is None:
+            result[period] = None
+            continue
+        window = {"start": start.isoformat()}
+        for metric in METRICS:
+            latest = getattr(current, f'last_{metric}')
+            baseline = getattr(previous, f'last_{metric}') if previous else getattr(current, f'first_{metric}')
+            window[metric] = {
+                "value": latest,
+                "change": latest - baseline,
+                "percent": round((latest - baseline) / baseline * 100, 2) if baseline else None,
+            }
+        result[period] = window
+    return result
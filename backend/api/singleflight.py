@@ -0,0 +1,137 @@
+"""Single-flight: concurrent callers for the same key share one execution.
+
+Within a process, the first caller runs the function and the others wait
+for its result (or exception). Across processes, the caller that runs
+first holds a lock in the cache backend. The others wait for the lock to
+be released and then ``reload`` the result the holder persisted.
+Coalescing across processes needs a shared cache backend (``CACHE_BACKEND``).
+"""
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+# Coroutine callers wait on futures of their own event loop
+_async_calls = weakref.WeakKeyDictionary()
+
+
+def do(key, fn, reload=None, timeout=None):
+    """Return ``fn()``, sharing one execution among concurrent callers of ``key``.
+
+    ``key`` is a tuple such as ``(provider, endpoint, user_id)``. When another
+    process already holds the key, ``reload()`` is called once it finishes;
+    if that returns ``None`` (the other process failed), ``fn`` runs here.
+    """
+    timeout = settings.SINGLEFLIGHT_TIMEOUT if timeout is None else timeout
+    name = ':'.join(str(part) for part in key)
+    flight = ':'.join(str(part) for part in key[:2])
+    with _calls_lock:
+        call = _calls.get(name)
+        leader = call is None
+        if leader:
+            call = _calls[name] = _Call()
+    if not leader:
+        metrics.singleflight_calls.inc(flight, 'shared')
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for the in-flight {name} call.")
+        if call.error is not None:
+            raise call.error
+        return call.result
+    try:
+        call.result = _run_locked(name, flight, fn, reload, timeout)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[name]
+        call.done.set()
+
+
+async def ado(key, fn, reload=None, timeout=None):
+    """``do`` for async views: ``fn`` and ``reload`` return awaitables."""
+    timeout = settings.SINGLEFLIGHT_TIMEOUT if timeout is None else timeout
+    name = ':'.join(str(part) for part in key)
+    flight = ':'.join(str(part) for part in key[:2])
+    loop = asyncio.get_running_loop()
+    calls = _async_calls.setdefault(loop, {})
+    future = calls.get(name)
+    if future is not None:
+        metrics.singleflight_calls.inc(flight, 'shared')
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    future = calls[name] = loop.create_future()
+    try:
+        result = await _arun_locked(name, flight, fn, reload, timeout)
+    except (Exception, asyncio.CancelledError) as e:
+        if isinstance(e, asyncio.CancelledError):
+            # The leader's client went away; release the waiters rather than hang them
+            e = TimeoutError(f"The in-flight {name} call was cancelled.")
+        future.set_exception(e)
+        # Nobody else may be waiting; don't log it as never retrieved
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del calls[name]
+
+
+async def _arun_locked(name, flight, fn, reload, timeout):
+    lock_key = f"singleflight:{name}"
+    token = uuid.uuid4().hex
+    if not await cache.aadd(lock_key, token, timeout=timeout):
+        metrics.singleflight_calls.inc(flight, 'remote')
+        deadline = time.monotonic() + timeout
+        while await cache.aget(lock_key) is not None and time.monotonic() < deadline:
+            await asyncio.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL)
+        result = await reload() if reload is not None else None
+        if result is not None:
+            return result
+        if not await cache.aadd(lock_key, token, timeout=timeout):
+            token = None
+    else:
+        metrics.singleflight_calls.inc(flight, 'leader')
+    try:
+        return await fn()
+    finally:
+        if token is not None and await cache.aget(lock_key) == token:
+            await cache.adelete(lock_key)
+
+
+def _run_locked(name, flight, fn, reload, timeout):
+    lock_key = f"singleflight:{name}"
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, timeout=timeout):
+        metrics.singleflight_calls.inc(flight, 'remote')
+        deadline = time.monotonic() + timeout
+        while cache.get(lock_key) is not None and time.monotonic() < deadline:
+            time.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL)
+        result = reload() if reload is not None else None
+        if result is not None:
+            return result
+        if not cache.add(lock_key, token, timeout=timeout):
+            # Holder presumed dead; its lock expires on its own
+            token = None
+    else:
+        metrics.singleflight_calls.inc(flight, 'leader')
+    try:
+        return fn()
+    finally:
+        if token is not None and cache.get(lock_key) == token:
+            cache.delete(lock_key)
@@ -0,0 +1,35 @@
+from django.db import transaction
+from .models import AnalyticsSummary
+from .push import payload_delta, publish
+
+
+def update_summary(user_id, **fields):
+    """Overwrite the given per-platform fields and recompute the totals atomically.
+
+    What changed is published to the user's push subscribers.
+    """
+    with transaction.atomic():
+        summary = AnalyticsSummary.objects.select_for_update().filter(user_id=user_id).first()
+        if summary is None:
+            summary = AnalyticsSummary(user_id=user_id)
+        before = summary.as_payload()
+        for name, value in fields.items():
+            setattr(summary, name, value)
+        summary.recompute_totals()
+        summary.save()
+        after = summary.as_payload()
+        del before['updated_at'], after['updated_at']
+        changes = payload_delta(before, after)
+        if changes:
+            publish(user_id, changes)
+    return summary
+
+
+def clear_platform(user_id, platform):
+    """Zero a disconnected platform's share of the summary, leaving the other's alone."""
+    names = {
+        'youtube': AnalyticsSummary.YOUTUBE_FIELDS,
+        'twitter': AnalyticsSummary.TWITTER_FIELDS,
+    }[platform]
+    defaults = {name: AnalyticsSummary._meta.get_field(name).get_default() for name in names}
+    return update_summary(user_id, **defaults)
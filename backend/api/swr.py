@@ -0,0 +1,94 @@
+"""Stale-while-revalidate cache for the per-user provider stats payloads.
+
+Entries hold the rendered payload with its validators. Within a provider's
+fresh TTL they are served as is. Within the following stale TTL they are
+still served, while a background thread rebuilds them. After that the
+caller computes the payload in the foreground. TTLs come from
+``STATS_CACHE_TTLS``.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.response import Response
+from .conditional import not_modified, with_validators
+from .metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+FRESH, STALE, MISS = 'fresh', 'stale', 'miss'
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.STATS_REVALIDATE_WORKERS, thread_name_prefix='stats-revalidate')
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def _key(provider, user_id):
+    return f"stats-payload:{provider}:{user_id}"
+
+
+async def alookup(provider, user_id):
+    """``(entry, state)`` where state is ``FRESH``, ``STALE`` or ``MISS``.
+
+    Reads through the cache's async API, so the stats views can call it on
+    the event loop.
+    """
+    entry = await cache.aget(_key(provider, user_id))
+    record_cache(f'{provider}_stats', entry is not None)
+    if entry is None:
+        return None, MISS
+    fresh_ttl, _ = settings.STATS_CACHE_TTLS[provider]
+    return entry, FRESH if time.time() - entry['stored_at'] < fresh_ttl else STALE
+
+
+def store(provider, user_id, payload, etag, last_modified):
+    fresh_ttl, stale_ttl = settings.STATS_CACHE_TTLS[provider]
+    entry = {'payload': payload, 'etag': etag, 'last_modified': last_modified,
+             'stored_at': time.time()}
+    cache.set(_key(provider, user_id), entry, timeout=fresh_ttl + stale_ttl)
+    return entry
+
+
+def invalidate(provider, user_id):
+    cache.delete(_key(provider, user_id))
+
+
+async def ainvalidate(provider, user_id):
+    await cache.adelete(_key(provider, user_id))
+
+
+def revalidate(provider, user_id, rebuild):
+    """Run ``rebuild()`` in the background unless it is already scheduled."""
+    key = _key(provider, user_id)
+    with _scheduled_lock:
+        if key in _scheduled:
+            return
+        _scheduled.add(key)
+
+    def task():
+        try:
+            rebuild()
+        except Exception as e:
+            logger.warning(f'[swr] Background refresh of {key} failed: {e}')
+        finally:
+            with _scheduled_lock:
+                _scheduled.discard(key)
+            connections.close_all()
+
+    _executor.submit(task)
+
+
+def respond(request, entry, stale=False):
+    """Cached entry as a response, or a 304 if the client's copy is current.
+
+    ``stale`` marks a fallback served because the upstream refresh failed.
+    """
+    cached = not_modified(request, entry['etag'], entry['last_modified'])
+    if cached is not None:
+        return cached
+    payload = {**entry['payload'], 'stale': True} if stale else entry['payload']
+    return with_validators(Response(payload), entry['etag'], entry['last_modified'])
@@ -1,3 +1,520 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone as dj_timezone
+from rest_framework.test import APIClient
+from . import circuit, jobs, quota, rollups, singleflight, swr
+from .authentication import ClaimsJWTAuthentication, bump_token_version, tokens_for_user
+from .models import (
+    AnalyticsSummary, Job, StatsEvent, TwitterCredential, TwitterStats, TwitterStatsRollup,
+)
+from .summary import clear_platform, update_summary
+from twitter_api.models import TwitterSyncState
+from youtube_api.models import YouTubeCredentials, YouTubeStats
 
-# Create your tests here.
+# Cache behaviour tested without a database, shared across threads
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('grace', email='grace@example.com', password='secret')
+        self.refresh = tokens_for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_user_is_built_from_claims(self):
+        auth = ClaimsJWTAuthentication()
+        token = auth.get_validated_token(str(self.refresh.access_token).encode())
+        auth.get_user(token)
+        # No user row is loaded, and the token version is cached after the first request
+        with self.assertNumQueries(0):
+            user = auth.get_user(token)
+        self.assertEqual((user.pk, user.username, user.email), (self.user.pk, 'grace', 'grace@example.com'))
+
+    def test_bumped_version_revokes_access_and_refresh_tokens(self):
+        self.assertEqual(self.client.get('/api/account_status/').status_code, 200)
+        self.assertEqual(self.client.post(
+            '/api/token/refresh/', {'refresh': str(self.refresh)}).status_code, 200)
+        bump_token_version(self.user.id)
+        self.assertEqual(self.client.get('/api/account_status/').status_code, 401)
+        self.assertEqual(self.client.post(
+            '/api/token/refresh/', {'refresh': str(self.refresh)}).status_code, 401)
+
+    def test_profile_change_reissues_tokens(self):
+        response = self.client.patch('/api/user/profile/', {'name': 'grace2'})
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get('/api/dashboard/').data['profile']['name'], 'grace2')
+
+    def test_password_change_and_deactivation_revoke_tokens(self):
+        self.user.last_login = dj_timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get('/api/account_status/').status_code, 200)
+        self.user.set_password('new-secret')
+        self.user.save()
+        self.assertEqual(self.client.get('/api/account_status/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.user).access_token}')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/account_status/').status_code, 401)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ivy', email='ivy@example.com', password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.user).access_token}')
+
+    def test_cached_flags_leave_one_query(self):
+        self.client.get('/api/dashboard/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.data['account'], {'youtube': False, 'twitter': False, 'instagram': False})
+        with self.assertNumQueries(0):
+            self.client.get('/api/account_status/')
+
+
+class TwitterStatusHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='secret')
+        TwitterCredential.objects.create(
+            user=self.user, twitter_username='alice',
+            access_token='token', access_token_secret='secret')
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        TwitterStats.objects.bulk_create([
+            TwitterStats(user=self.user, followers_count=i, tweets_count=i,
+                         likes_count=i, recorded_at=start + timedelta(days=i))
+            for i in range(10)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_range_query_uses_user_recorded_index(self):
+        plan = TwitterStats.objects.filter(
+            user=self.user,
+            recorded_at__gte=datetime(2025, 1, 3, tzinfo=timezone.utc),
+        ).order_by('recorded_at', 'id').explain()
+        self.assertIn('twitterstats_user_recorded_idx', plan)
+
+    def test_range_filter(self):
+        response = self.client.get(
+            '/api/twitter/status/', {'from': '2025-01-03', 'to': '2025-01-05'})
+        self.assertEqual(
+            [row['followers_count'] for row in response.data['data']], [2, 3, 4])
+        self.assertIsNone(response.data['next'])
+
+    def test_bare_to_date_covers_the_whole_day(self):
+        TwitterStats.objects.create(user=self.user, followers_count=100, tweets_count=0, likes_count=0,
+                                    recorded_at=datetime(2025, 1, 5, 12, tzinfo=timezone.utc))
+        response = self.client.get(
+            '/api/twitter/status/', {'from': '2025-01-05', 'to': '2025-01-05'})
+        self.assertEqual(
+            [row['followers_count'] for row in response.data['data']], [4, 100])
+
+    def test_impossible_dates_are_rejected(self):
+        for bound in ({'from': '2025-02-30'}, {'to': '2025-01-01T25:00'}):
+            with self.subTest(**bound):
+                response = self.client.get('/api/twitter/status/', bound)
+                self.assertEqual(response.status_code, 400)
+
+    def test_keyset_pagination(self):
+        seen, after = [], None
+        while True:
+            params = {'limit': 4}
+            if after:
+                params['after'] = after
+            response = self.client.get('/api/twitter/status/', params)
+            seen += [row['followers_count'] for row in response.data['data']]
+            after = response.data['next']
+            if after is None:
+                break
+        self.assertEqual(seen, list(range(10)))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/twitter/status/', {'after': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get('/api/twitter/status/')
+        etag = response['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/twitter/status/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        TwitterStats.objects.create(
+            user=self.user, followers_count=99, tweets_count=0, likes_count=0)
+        response = self.client.get('/api/twitter/status/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class MetricsTests(TestCase):
+    def test_views_and_caches_are_exposed(self):
+        user = User.objects.create_user('bob', password='secret')
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get('/api/account_status/')
+        client.get('/api/account_status/')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('socialsync_view_db_queries_count{view="get_account_status"}', body)
+        self.assertIn('socialsync_cache_hit_ratio{cache="account_flags"}', body)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('carol', password='secret')
+        TwitterCredential.objects.create(
+            user=self.user, twitter_username='carol',
+            access_token='token', access_token_secret='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_refreshes_collapse(self):
+        first = self.client.post('/api/twitter/refresh/')
+        second = self.client.post('/api/twitter/refresh/')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_worker_runs_job(self):
+        job_id = self.client.post('/api/twitter/refresh/').data['id']
+        twitter_user = SimpleNamespace(followers_count=7, statuses_count=3, favourites_count=2)
+        with mock.patch('api.jobs._verify', return_value=twitter_user):
+            jobs.work(once=True)
+        response = self.client.get(f'/api/jobs/{job_id}/')
+        self.assertEqual(response.data['status'], Job.SUCCEEDED)
+        self.assertEqual(TwitterStats.objects.get(user=self.user).followers_count, 7)
+        # A new request after the job started gets its own job
+        self.assertNotEqual(self.client.post('/api/twitter/refresh/').data['id'], job_id)
+
+    def test_permanent_failure_is_not_retried(self):
+        job_id = self.client.post('/api/twitter/connect/', {
+            'access_token': 'a', 'access_token_secret': 'b'}).data['id']
+        with mock.patch('api.jobs._verify', side_effect=jobs.PermanentJobError('Unauthorized')):
+            jobs.work(once=True)
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.attempts, job.payload), (Job.FAILED, 1, {}))
+
+    def test_jobs_are_private(self):
+        job_id = self.client.post('/api/twitter/refresh/').data['id']
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('dave', password='secret'))
+        self.assertEqual(other.get(f'/api/jobs/{job_id}/').status_code, 404)
+
+
+@override_settings(TIME_ZONE='UTC')
+class TwitterRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('kate', password='secret')
+
+    def record(self, day, hour, followers):
+        # Created without the post_save receiver, folded explicitly
+        stats = TwitterStats(user=self.user, followers_count=followers, tweets_count=1, likes_count=2,
+                             recorded_at=datetime(2025, 5, day, hour, tzinfo=timezone.utc))
+        TwitterStats.objects.bulk_create([stats])
+        rollups.record_snapshot(stats)
+
+    def test_snapshots_fold_into_every_period(self):
+        self.record(14, 12, 110)
+        self.record(14, 8, 100)
+        self.record(14, 18, 120)
+        day = TwitterStatsRollup.objects.get(user=self.user, period='day')
+        self.assertEqual((day.first_followers, day.last_followers, day.samples), (100, 120, 3))
+        self.assertEqual(set(TwitterStatsRollup.objects.values_list('period', 'period_start')), {
+            ('day', date(2025, 5, 14)), ('week', date(2025, 5, 12)),
+            ('month', date(2025, 5, 1)), ('quarter', date(2025, 4, 1))})
+
+    def test_concurrently_created_period_is_folded_into(self):
+        self.record(14, 8, 100)
+        real = rollups._locked_rollup
+        missed = set()
+
+        def lost_race(user_id, period, start):
+            # The first lookup runs before the other refresher's insert commits
+            if period not in missed:
+                missed.add(period)
+                return None
+            return real(user_id, period, start)
+
+        with mock.patch('api.rollups._locked_rollup', side_effect=lost_race):
+            self.record(14, 9, 105)
+        self.assertEqual(TwitterStatsRollup.objects.count(), 4)
+        day = TwitterStatsRollup.objects.get(user=self.user, period='day')
+        self.assertEqual((day.last_followers, day.samples), (105, 2))
+
+    def test_growth_against_the_previous_period(self):
+        self.record(13, 12, 80)
+        self.record(14, 8, 100)
+        self.record(14, 18, 120)
+        result = rollups.growth(self.user, today=date(2025, 5, 14))
+        self.assertEqual(result['day']['followers'], {'value': 120, 'change': 40, 'percent': 50.0})
+        # No earlier week: the week's own first value is the baseline
+        self.assertEqual(result['week']['followers']['change'], 40)
+        self.assertIsNone(rollups.growth(self.user, today=date(2025, 5, 20))['day'])
+
+
+class SummaryOwnershipTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('judy', password='secret')
+        update_summary(self.user.id, youtube_subscribers=5, twitter_followers=9)
+
+    def summary(self):
+        return AnalyticsSummary.objects.get(user=self.user)
+
+    def test_legacy_stats_rows_leave_the_summary_to_the_sync(self):
+        TwitterStats.objects.create(user=self.user, followers_count=1, tweets_count=1, likes_count=1)
+        self.assertEqual(self.summary().twitter_followers, 9)
+
+    def test_clearing_a_platform_keeps_the_other(self):
+        clear_platform(self.user.id, 'youtube')
+        self.assertEqual((self.summary().youtube_subscribers, self.summary().twitter_followers), (0, 9))
+        update_summary(self.user.id, youtube_subscribers=5)
+        clear_platform(self.user.id, 'twitter')
+        self.assertEqual((self.summary().youtube_subscribers, self.summary().twitter_followers), (5, 0))
+
+    def test_legacy_disconnect_keeps_the_summary(self):
+        TwitterCredential.objects.create(user=self.user, twitter_username='judy',
+                                         access_token='token', access_token_secret='secret')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.delete('/api/twitter/disconnect/').status_code, 200)
+        self.assertEqual(self.summary().twitter_followers, 9)
+
+
+@override_settings(STATS_STREAM_POLL_INTERVAL=0.05)
+class StatsStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('erin', password='secret')
+        self.token = str(tokens_for_user(self.user).access_token)
+
+    def test_only_changed_fields_are_published(self):
+        update_summary(self.user.id, youtube_subscribers=10, youtube_views=100)
+        update_summary(self.user.id, youtube_subscribers=12, youtube_views=100)
+        update_summary(self.user.id, youtube_subscribers=12)
+        changes = list(StatsEvent.objects.order_by('id').values_list('changes', flat=True))
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(changes[1], {'youtube': {'subscribers': 12}})
+
+    async def test_snapshot_then_deltas(self):
+        response = await self.async_client.get(f'/api/stats/stream/?token={self.token}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        try:
+            snapshot = await anext(events)
+            self.assertTrue(snapshot.startswith(b'event: snapshot\ndata: {"total_views":0,'))
+            await sync_to_async(update_summary)(self.user.id, twitter_followers=7)
+            delta = await asyncio.wait_for(anext(events), 5)
+            self.assertEqual(delta, b'event: delta\ndata: {"twitter":{"followers":7}}\n\n')
+        finally:
+            await events.aclose()
+
+    async def test_new_twitter_history_rows_are_pushed(self):
+        response = await self.async_client.get(f'/api/stats/stream/?token={self.token}')
+        events = aiter(response.streaming_content)
+        try:
+            await anext(events)
+            recorded_at = datetime(2025, 1, 5, 12, tzinfo=timezone.utc)
+            await TwitterStats.objects.acreate(user=self.user, followers_count=3, tweets_count=2,
+                                               likes_count=1, recorded_at=recorded_at)
+            delta = await asyncio.wait_for(anext(events), 5)
+            self.assertEqual(delta, b'event: delta\ndata: {"twitter_history":{"followers":3,"tweets":2,'
+                                    b'"likes":1,"recorded_at":"2025-01-05T12:00:00+00:00"}}\n\n')
+        finally:
+            await events.aclose()
+        # The summary's Twitter fields are left to the sync
+        self.assertFalse(await AnalyticsSummary.objects.filter(user=self.user).aexists())
+
+    def test_token_required(self):
+        response = self.client.get('/api/stats/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_cache'}})
+class AsyncViewsDatabaseCacheTests(TestCase):
+    """The async stats views must not touch a database-backed cache from the event loop."""
+
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        self.user = User.objects.create_user('frank', password='secret')
+        self.headers = {'Authorization': f'Bearer {tokens_for_user(self.user).access_token}'}
+        YouTubeCredentials.objects.create(user=self.user, access_token='token')
+        YouTubeStats.objects.create(user=self.user, title='Channel', refreshed_at=dj_timezone.now())
+        TwitterSyncState.objects.create(user=self.user, twitter_user_id='1000',
+                                        synced_at=dj_timezone.now())
+
+    async def test_stats_views(self):
+        for path in ('/youtube/stats/', '/twitter/stats/'):
+            with self.subTest(path=path):
+                miss = await self.async_client.get(path, headers=self.headers)
+                self.assertEqual(miss.status_code, 200)
+                hit = await self.async_client.get(
+                    path, headers={**self.headers, 'If-None-Match': miss['ETag']})
+                self.assertEqual(hit.status_code, 304)
+                self.assertIsNotNone(await cache.aget(f'stats-payload:{path.split("/")[1]}:{self.user.id}'))
+
+    async def test_single_flight_lock(self):
+        async def fetch():
+            return 'stats'
+
+        self.assertEqual(await singleflight.ado(('test', 'stats', 4), fetch), 'stats')
+        self.assertIsNone(await cache.aget('singleflight:test:stats:4'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        calls, started = [], threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'stats'
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            first = pool.submit(singleflight.do, ('test', 'stats', 1), fetch)
+            started.wait()
+            others = [pool.submit(singleflight.do, ('test', 'stats', 1), fetch) for _ in range(4)]
+            results = [first.result()] + [f.result() for f in others]
+        self.assertEqual(results, ['stats'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_other_process_then_reloads(self):
+        cache.add('singleflight:test:stats:2', 'other-process', timeout=5)
+        threading.Timer(0.2, cache.delete, ['singleflight:test:stats:2']).start()
+        result = singleflight.do(('test', 'stats', 2), lambda: self.fail('fetched twice'),
+                                 reload=lambda: 'persisted')
+        self.assertEqual(result, 'persisted')
+
+    def test_coroutines_share_one_call(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'stats'
+
+        async def main():
+            return await asyncio.gather(
+                *(singleflight.ado(('test', 'stats', 3), fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ['stats'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(STATS_CACHE_TTLS={'test': (60, 60)}, CACHES=LOCMEM_CACHE)
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        swr.invalidate('test', 1)
+
+    def lookup(self):
+        return async_to_sync(swr.alookup)('test', 1)
+
+    def test_fresh_then_stale_then_miss(self):
+        entry = swr.store('test', 1, {'views': 1}, '"v1"', None)
+        self.assertEqual(self.lookup(), (entry, swr.FRESH))
+        with mock.patch('api.swr.time.time', return_value=entry['stored_at'] + 90):
+            self.assertEqual(self.lookup()[1], swr.STALE)
+        swr.invalidate('test', 1)
+        self.assertEqual(self.lookup(), (None, swr.MISS))
+
+    def test_revalidate_runs_once_in_background(self):
+        calls, release = [], threading.Event()
+
+        def rebuild():
+            calls.append(1)
+            release.wait(1)
+            swr.store('test', 1, {'views': 2}, '"v2"', None)
+
+        swr.revalidate('test', 1, rebuild)
+        swr.revalidate('test', 1, rebuild)
+        release.set()
+        for _ in range(50):
+            if self.lookup()[0]:
+                break
+            time.sleep(0.02)
+        self.assertEqual(self.lookup()[0]['payload'], {'views': 2})
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(CIRCUIT_FAILURE_THRESHOLD=3, CIRCUIT_OPEN_SECONDS=30,
+                   CACHES=LOCMEM_CACHE)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_opens_after_repeated_failures(self):
+        for _ in range(3):
+            circuit.before_call('test', '/2/users/12345/tweets')
+            circuit.record_failure('test', '/2/users/12345/tweets')
+        with self.assertRaises(circuit.CircuitOpen):
+            circuit.before_call('test', '/2/users/67890/tweets')
+        circuit.before_call('test', '/2/users/me')
+
+    def test_single_trial_call_closes_it(self):
+        for _ in range(3):
+            circuit.record_failure('test', '/reports')
+        later = time.time() + 31
+        with mock.patch('api.circuit.time.time', return_value=later):
+            circuit.before_call('test', '/reports')
+            with self.assertRaises(circuit.CircuitOpen):
+                circuit.before_call('test', '/reports')
+            circuit.record_success('test', '/reports')
+            circuit.before_call('test', '/reports')
+
+
+@override_settings(CACHES=LOCMEM_CACHE, QUOTA_INTERACTIVE_RESERVE=0.25,
+                   UPSTREAM_QUOTAS={'test': {'app': (100, 100), 'user': (10, 100)}})
+class QuotaTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('api.quota.time.time', return_value=1000.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cost_is_taken_from_every_bucket(self):
+        quota.charge('test', 1, cost=4)
+        self.assertEqual(quota.remaining('test', 1), {'app': 96, 'user': 6})
+        self.assertEqual(quota.remaining('test', 2), {'app': 96, 'user': 10})
+
+    def test_refused_call_charges_nothing(self):
+        quota.charge('test', 1, cost=8)
+        with self.assertRaises(quota.QuotaExceeded) as refused:
+            quota.charge('test', 1, cost=5)
+        # Three units short at one unit per 10 seconds
+        self.assertAlmostEqual(refused.exception.retry_after, 30)
+        self.assertEqual(quota.remaining('test', 1), {'app': 92, 'user': 2})
+
+    def test_buckets_refill_over_time(self):
+        quota.charge('test', 1, cost=10)
+        self.clock.return_value = 1050.0
+        self.assertEqual(quota.remaining('test', 1)['user'], 5)
+        self.clock.return_value = 2000.0
+        self.assertEqual(quota.remaining('test', 1)['user'], 10)
+
+    def test_background_work_leaves_the_reserve(self):
+        quota.charge('test', 1, cost=7, priority=quota.BACKGROUND)
+        with self.assertRaises(quota.QuotaExceeded):
+            quota.charge('test', 1, priority=quota.BACKGROUND)
+        quota.charge('test', 1, cost=3)
@@ -6,8 +6,13 @@ from .views import (
     disconnect_twitter,
     refresh_twitter_stats,
     get_twitter_status,
+    get_twitter_growth,
     get_account_status,
+    get_dashboard,
+    get_job,
     user_profile,   # added by vishal
+    get_analytics_summary,
+    StatsStreamView,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -16,10 +21,15 @@ urlpatterns = [
     path('login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('account_status/', get_account_status, name='get_account_status'),
+    path('dashboard/', get_dashboard, name='get_dashboard'),
     path('user/profile/', user_profile, name='user_profile'),  # added by Vishal for user profile
+    path('analytics/summary/', get_analytics_summary, name='get_analytics_summary'),
+    path('stats/stream/', StatsStreamView.as_view(), name='stats_stream'),
+    path('jobs/<int:job_id>/', get_job, name='get_job'),
     # Twitter endpoints
     path('twitter/connect/', connect_twitter, name='connect_twitter'),
     path('twitter/status/', get_twitter_status, name='get_twitter_status'),
+    path('twitter/growth/', get_twitter_growth, name='get_twitter_growth'),
     path('twitter/refresh/', refresh_twitter_stats, name='refresh_twitter_stats'),
     path('twitter/disconnect/', disconnect_twitter, name='disconnect_twitter'),
 ]
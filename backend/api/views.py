@@ -1,13 +1,24 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+import hmac
 from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework import status
 from django.contrib.auth.models import User
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
-import tweepy
-from .models import TwitterCredential, TwitterStats, SocialAccount
+from . import jobs, metrics, push
+from .accounts import account_flags
+from .asyncview import AsyncAPIView
+from .authentication import StreamJWTAuthentication, tokens_for_user
+from .conditional import make_etag, not_modified, with_validators
+from .models import AnalyticsSummary, Job, TwitterCredential, TwitterStats
+from .pagination import InvalidQuery, keyset_page, parse_bound, parse_limit
+from .renderers import EventStreamRenderer, FastJSONRenderer
+from .rollups import growth
 
 
 # User signup view
@@ -33,75 +44,76 @@ class SignupView(APIView):
 # Custom JWT token view to include username in response
 class CustomTokenObtainPairView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        if response.status_code == 200:
-            user = User.objects.get(username=request.data.get('username'))
-            response.data['name'] = user.username
-        return response
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        # The serializer already loaded the user; no second lookup needed
+        data = dict(serializer.validated_data)
+        data['name'] = serializer.user.username
+        return Response(data, status=status.HTTP_200_OK)
 
 
 # Get account status
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_account_status(request):
+    return Response(account_flags(request.user.id))
+
+
+# Everything the dashboard needs on load, in one request. With the account
+# flags and token version in the shared cache, it reads only the summary row.
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_dashboard(request):
     user = request.user
-    try:
-        account = SocialAccount.objects.get(user=user)
-        return Response({
-            'youtube': account.youtube,
-            'twitter': account.twitter,
-            'instagram': account.instagram,
-        })
-    except SocialAccount.DoesNotExist:
-        return Response({
-            'youtube': False,
-            'twitter': False,
-            'instagram': False,
-        })
+    summary = AnalyticsSummary.objects.filter(user=user).first()
+    if summary is None:
+        summary = AnalyticsSummary(user=user)
+    now = timezone.now()
+    staleness = {}
+    for platform, refreshed_at, interval in (
+        ('youtube', summary.youtube_refreshed_at, settings.YOUTUBE_STATS_REFRESH_INTERVAL),
+        ('twitter', summary.twitter_refreshed_at, settings.TWITTER_SYNC_INTERVAL),
+    ):
+        age = (now - refreshed_at).total_seconds() if refreshed_at else None
+        staleness[platform] = {
+            "last_refreshed": refreshed_at.isoformat() if refreshed_at else None,
+            "age_seconds": int(age) if age is not None else None,
+            "stale": age is None or age > interval,
+        }
+    return Response({
+        "account": account_flags(user.id),
+        "profile": {"name": user.username, "email": user.email},
+        "summary": summary.as_payload(),
+        "staleness": staleness,
+    })
 
 
+def job_accepted(job):
+    return Response({**job.as_payload(), "status_url": f"/api/jobs/{job.id}/"}, status=202)
+
+
+# Credentials are verified by a background job; poll status_url for the outcome
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def connect_twitter(request):
-    api_key = settings.TWITTER_API_KEY
-    api_secret = settings.TWITTER_API_SECRET
     access_token = request.data.get("access_token")
     access_token_secret = request.data.get("access_token_secret")
 
     if not access_token or not access_token_secret:
         return Response({"error": "Access tokens are required."}, status=400)
 
-    try:
-        # Authenticate with Twitter API
-        auth = tweepy.OAuth1UserHandler(
-            api_key, api_secret, access_token, access_token_secret)
-        api = tweepy.API(auth)
-        user = api.verify_credentials()
-
-        # Save Twitter credentials
-        TwitterCredential.objects.update_or_create(
-            user=request.user,
-            defaults={
-                "access_token": access_token,
-                "access_token_secret": access_token_secret,
-                "twitter_username": user.screen_name,
-            },
-        )
-
-        # Fetch and store initial stats
-        TwitterStats.objects.create(
-            user=request.user,
-            followers_count=user.followers_count,
-            tweets_count=user.statuses_count,
-            likes_count=user.favourites_count,
-        )
-
-        return Response({"message": "Twitter account connected and stats saved successfully."}, status=200)
-    except Exception as e:
-        return Response({"error": str(e)}, status=500)
+    job, _ = jobs.enqueue(request.user.id, jobs.TWITTER_CONNECT, {
+        "access_token": access_token,
+        "access_token_secret": access_token_secret,
+    })
+    return job_accepted(job)
 
 
-# Get Twitter stats
+# Get Twitter stats, optionally ?from=&to= bounded and ?after=&limit= paginated.
+# Pages run oldest first: without ?from= the first page starts at the oldest row.
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_twitter_status(request):
@@ -112,11 +124,27 @@ def get_twitter_status(request):
         except TwitterCredential.DoesNotExist:
             return Response({"connected": False, "data": []})
 
-        # Fetch Twitter stats
-        stats = TwitterStats.objects.filter(
-            user=request.user).order_by('recorded_at')
-        if not stats:
-            return Response({"connected": True, "data": []})
+        latest = TwitterStats.objects.filter(user=request.user).order_by(
+            '-recorded_at', '-id').values_list('id', 'recorded_at').first()
+        if latest is not None:
+            etag = make_etag('twitter-status', request.user.id, creds.twitter_username,
+                             *latest, request.GET.urlencode())
+            cached = not_modified(request, etag, latest[1])
+            if cached is not None:
+                return cached
+
+        params = request.query_params
+        try:
+            stats = TwitterStats.objects.filter(user=request.user)
+            if params.get('from'):
+                stats = stats.filter(recorded_at__gte=parse_bound(params['from'], 'from'))
+            if params.get('to'):
+                stats = stats.filter(recorded_at__lte=parse_bound(params['to'], 'to', end=True))
+            limit = parse_limit(params.get('limit'), settings.TWITTER_STATS_PAGE_SIZE,
+                                settings.TWITTER_STATS_MAX_PAGE_SIZE)
+            page, next_cursor = keyset_page(stats, params.get('after'), limit)
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=400)
 
         data = [
             {
@@ -125,39 +153,41 @@ def get_twitter_status(request):
                 "tweets_count": stat.tweets_count,
                 "likes_count": stat.likes_count,
                 "timestamp": stat.recorded_at.strftime("%Y-%m-%d"),
-            } for stat in stats
+            } for stat in page
         ]
-        return Response({"connected": True, "data": data})
+        response = Response({"connected": True, "data": data, "next": next_cursor})
+        if latest is not None:
+            with_validators(response, etag, latest[1])
+        return response
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
 
+# Twitter growth this day, week, month and quarter
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_twitter_growth(request):
+    if not TwitterCredential.objects.filter(user=request.user).exists():
+        return Response({"connected": False, "growth": {}})
+    return Response({"connected": True, "growth": growth(request.user)})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def refresh_twitter_stats(request):
-    try:
-        creds = TwitterCredential.objects.get(user=request.user)
-        auth = tweepy.OAuth1UserHandler(
-            settings.TWITTER_API_KEY,
-            settings.TWITTER_API_SECRET,
-            creds.access_token,
-            creds.access_token_secret,
-        )
-        api = tweepy.API(auth)
-        user = api.verify_credentials()
-
-        # Save new stats
-        TwitterStats.objects.create(
-            user=request.user,
-            followers_count=user.followers_count,
-            tweets_count=user.statuses_count,
-            likes_count=user.favourites_count,
-        )
-        return Response({"message": "Stats refreshed successfully."})
-    except TwitterCredential.DoesNotExist:
+    if not TwitterCredential.objects.filter(user=request.user).exists():
         return Response({"error": "Twitter not connected."}, status=404)
-    except Exception as e:
-        return Response({"error": str(e)}, status=500)
+    job, _ = jobs.enqueue(request.user.id, jobs.TWITTER_REFRESH)
+    return job_accepted(job)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_job(request, job_id):
+    job = Job.objects.filter(pk=job_id, user=request.user).first()
+    if job is None:
+        return Response({"error": "Job not found."}, status=404)
+    return Response(job.as_payload())
 
 
 # Disconnect Twitter account
@@ -165,17 +195,46 @@ def refresh_twitter_stats(request):
 @permission_classes([IsAuthenticated])
 def disconnect_twitter(request):
     try:
+        # Only the legacy credentials: the summary belongs to the OAuth2 connection
         TwitterCredential.objects.get(user=request.user).delete()
         return Response({"message": "Twitter disconnected."})
     except TwitterCredential.DoesNotExist:
         return Response({"error": "Twitter not connected."}, status=404)
 
 
+# Cross-platform totals from the materialized summary
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_analytics_summary(request):
+    summary = AnalyticsSummary.objects.filter(user=request.user).first()
+    if summary is None:
+        summary = AnalyticsSummary(user=request.user)
+    return Response(summary.as_payload())
+
+
+class StatsStreamView(AsyncAPIView):
+    """The summary as server-sent events: a ``snapshot``, then a ``delta`` per change.
+
+    New Twitter history rows arrive as a ``twitter_history`` delta.
+    """
+    authentication_classes = [StreamJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, EventStreamRenderer]
+
+    async def get(self, request):
+        response = StreamingHttpResponse(push.stream(request.user.id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 # User profile (added by Vishal)
 @api_view(['GET', 'PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def user_profile(request):
-    user = request.user
+    # request.user is built from token claims; read and write the real row
+    user = User.objects.get(pk=request.user.pk)
     if request.method == 'GET':
         return Response({
             'name': user.username,
@@ -192,9 +251,22 @@ def user_profile(request):
             user.email = email
             updated = True
         if updated:
+            # Saving revokes the tokens carrying the old claims; hand out new ones
             user.save()
-            return Response({'message': 'Profile updated successfully.', 'name': user.username, 'email': user.email})
+            refresh = tokens_for_user(user)
+            return Response({'message': 'Profile updated successfully.', 'name': user.username,
+                             'email': user.email, 'access': str(refresh.access_token),
+                             'refresh': str(refresh)})
         else:
             return Response({'message': 'No changes made.'})
     else:
         return Response({'error': 'Method not allowed.'}, status=405)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; plain Django so it skips JWT auth and renderers."""
+    if settings.METRICS_TOKEN:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, settings.METRICS_TOKEN):
+            return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
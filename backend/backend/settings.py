@@ -22,6 +22,24 @@ TWITTER_API_SECRET = os.getenv("API_KAY_SECRET")
 TWITTER_CLIENT_ID = os.getenv("TWITTER_CLIENT_ID")
 TWITTER_CLIENT_SECRET = os.getenv("TWITTER_CLIENT_SECRET")
 TWITTER_CALLBACK_URL = 'http://localhost:8000/twitter/callback/'
+TWITTER_API_BASE_URL = os.getenv("TWITTER_API_BASE_URL", "https://api.twitter.com")
+# Shared Twitter HTTP client: timeouts in seconds, retries on 429/5xx
+TWITTER_CONNECT_TIMEOUT = 3.05
+TWITTER_READ_TIMEOUT = 10
+TWITTER_MAX_RETRIES = 2
+TWITTER_MAX_BACKOFF = 5
+TWITTER_POOL_SIZE = 10
+# Upper bound in seconds on one logical call, retries and backoff included
+TWITTER_REQUEST_DEADLINE = 15
+# Connection pool size of each httpx client used by the async views
+ASYNC_HTTP_MAX_CONNECTIONS = 100
+# Seconds before stored tweets are re-synced, and how far back metrics are refreshed
+TWITTER_SYNC_INTERVAL = 300
+TWITTER_SYNC_MAX_PAGES = 32
+TWITTER_METRICS_REFRESH_DAYS = 7
+# Default and maximum page size for /api/twitter/status/
+TWITTER_STATS_PAGE_SIZE = 500
+TWITTER_STATS_MAX_PAGE_SIZE = 1000
 # Must match one in Google Console
 GOOGLE_OAUTH2_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_OAUTH2_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -31,6 +49,87 @@ GOOGLE_OAUTH2_SCOPES = [
     "https://www.googleapis.com/auth/youtube.readonly",
     "https://www.googleapis.com/auth/yt-analytics.readonly",
 ]
+# Seconds between background refreshes of stored YouTube stats
+YOUTUBE_STATS_REFRESH_INTERVAL = int(
+    os.getenv("YOUTUBE_STATS_REFRESH_INTERVAL", 900))
+# Wall-clock budget (seconds) for one stats fetch and the threads serving it
+YOUTUBE_STATS_DEADLINE = float(os.getenv("YOUTUBE_STATS_DEADLINE", 15))
+YOUTUBE_FETCH_WORKERS = int(os.getenv("YOUTUBE_FETCH_WORKERS", 8))
+# Days of channel trends in the stats payload. Analytics rows older than
+# the settle window are final: they are kept locally and not queried again.
+YOUTUBE_TREND_DAYS = 30
+YOUTUBE_ANALYTICS_SETTLE_DAYS = 3
+# Uploads playlist pages (50 videos each) read per refresh; bigger channels
+# are backfilled over several refreshes
+YOUTUBE_UPLOADS_MAX_PAGES = 20
+# Uploads younger than this get fresh statistics on every refresh, plus
+# this many older ones, least recently refreshed first
+YOUTUBE_VIDEO_REFRESH_DAYS = 30
+YOUTUBE_VIDEO_REFRESH_BATCH = 50
+# Max cached googleapiclient discovery documents / service skeletons
+YOUTUBE_SERVICE_CACHE_SIZE = 8
+# Optional base URL per Google API name, e.g. to point at stand-in servers
+YOUTUBE_API_ENDPOINTS = {}
+
+# Seconds the per-user connected-account flags stay cached (also invalidated on save)
+ACCOUNT_FLAGS_CACHE_TTL = 3600
+
+# Upstream quota buckets as (capacity, seconds to refill completely). YouTube
+# Data API units are per day per project; Twitter v2 limits are per
+# 15-minute window per endpoint.
+UPSTREAM_QUOTAS = {
+    'youtube': {'app': (10000, 86400), 'user': (500, 86400)},
+    'youtubeAnalytics': {'app': (50000, 86400), 'user': (500, 86400)},
+    'twitter:users/me': {'user': (75, 900)},
+    'twitter:users/tweets': {'app': (1500, 900), 'user': (900, 900)},
+    'twitter:tweets': {'app': (450, 900), 'user': (900, 900)},
+}
+# Share of every bucket that background refreshes may not consume
+QUOTA_INTERACTIVE_RESERVE = 0.25
+
+# OAuth access tokens are refreshed this many seconds before they expire
+OAUTH_REFRESH_MARGIN = 600
+OAUTH_REFRESH_INTERVAL = 60
+# A token whose background refresh fails is retried after exponentially
+# growing waits, up to this many seconds (revoked grants never recover)
+OAUTH_REFRESH_MAX_BACKOFF = 86400
+
+# Background job queue (run_jobs): worker processes, idle poll seconds,
+# attempts before a job fails, seconds between attempts, and seconds after
+# which a running job is presumed orphaned by a dead worker
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 30
+JOB_TIMEOUT = 300
+
+# Longest a coalesced caller waits for the in-flight upstream fetch it joined,
+# and how often it checks the cross-process lock
+SINGLEFLIGHT_TIMEOUT = 30
+SINGLEFLIGHT_POLL_INTERVAL = 0.1
+
+# Cached stats payloads per provider: (fresh, stale) seconds. Fresh entries
+# are served as is; stale ones are served while a background thread rebuilds them
+STATS_CACHE_TTLS = {
+    'youtube': (300, 3600),
+    'twitter': (TWITTER_SYNC_INTERVAL, 3600),
+}
+STATS_REVALIDATE_WORKERS = 4
+
+# Upstream circuit breakers: failures within the window that open a breaker,
+# and seconds it stays open before a trial call is let through
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_FAILURE_WINDOW = 60
+CIRCUIT_OPEN_SECONDS = 30
+
+# Stats push stream: how often each server process looks for changes written
+# by other processes, seconds between keepalive comments, changes a slow
+# subscriber may have queued before it is resent the full summary, and how
+# long change rows are kept
+STATS_STREAM_POLL_INTERVAL = 1.0
+STATS_STREAM_KEEPALIVE = 15
+STATS_STREAM_QUEUE_SIZE = 100
+STATS_EVENT_RETENTION = 300
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -49,11 +148,31 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.ClaimsTokenRefreshSerializer',
+}
+# Seconds a user's token version stays cached (bumps clear it immediately)
+TOKEN_VERSION_CACHE_TTL = 3600
+
+# Responses smaller than this are sent uncompressed
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+RESPONSE_BROTLI_QUALITY = 5
+
+# If set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -96,6 +215,26 @@ DATABASES = {
     }
 }
 
+# Shared by every server worker, the refreshers and the job worker: token
+# revocation, SWR invalidation, circuit breakers, quotas and single-flight
+# locks only hold when they all see the same cache. Set REDIS_URL (as
+# docker-compose does) to share one Redis; without it each process keeps its
+# own in-memory cache, which only suits a single process.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -1,10 +1,12 @@
 
 from django.contrib import admin
 from django.urls import path, include
+from api.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('youtube/', include('youtube_api.urls')),
     path('twitter/', include('twitter_api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,151 @@
+"""Seed data, wiring and load generation shared by the benchmark commands."""
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, connections, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from api.authentication import tokens_for_user
+from api.models import SocialAccount, TwitterCredential, TwitterStats
+from api.rollups import rebuild_rollups
+from twitter_api.client import async_client, client as twitter_client
+from twitter_api.models import TwitterOAuth2Token
+from youtube_api.models import YouTubeCredentials
+from youtube_api.services import get_service
+
+PASSWORD = 'bench-password'
+
+ENDPOINTS = [
+    ('login', 'POST', '/api/login/'),
+    ('account_status', 'GET', '/api/account_status/'),
+    ('dashboard', 'GET', '/api/dashboard/'),
+    ('analytics_summary', 'GET', '/api/analytics/summary/'),
+    ('user_profile', 'GET', '/api/user/profile/'),
+    ('twitter_status', 'GET', '/api/twitter/status/'),
+    ('twitter_growth', 'GET', '/api/twitter/growth/'),
+    ('youtube_stats', 'GET', '/youtube/stats/'),
+    ('twitter_stats', 'GET', '/twitter/stats/'),
+]
+
+
+@contextmanager
+def test_database():
+    """A throwaway file-backed SQLite database, so worker threads can share it."""
+    setup_test_environment()
+    fd, path = tempfile.mkstemp(suffix='.sqlite3', prefix='socialsync-bench-')
+    os.close(fd)
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+    # Worker threads write concurrently (last_login, snapshots): wait for the lock
+    connection.settings_dict.setdefault('OPTIONS', {}).update(timeout=30, transaction_mode='IMMEDIATE')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield path
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def upstream_settings(twitter, google):
+    """Point the Twitter client and the Google service skeletons at stand-ins."""
+    # Discovery method paths already carry the "youtube/v3/" or "v2/" prefix
+    endpoints = {'youtube': f"{google.url}/", 'youtubeAnalytics': f"{google.url}/"}
+    original_base_url = twitter_client.base_url
+    with override_settings(YOUTUBE_API_ENDPOINTS=endpoints, TWITTER_API_BASE_URL=twitter.url):
+        get_service.cache_clear()
+        twitter_client.base_url = async_client.base_url = twitter.url
+        try:
+            yield
+        finally:
+            twitter_client.base_url = async_client.base_url = original_base_url
+            get_service.cache_clear()
+
+
+def seed_users(count, history=200):
+    """Create connected users with stats history; returns ``[(user, access_token)]``."""
+    password = make_password(PASSWORD)
+    far_future = timezone.now() + timedelta(days=30)
+    seeded = []
+    for i in range(count):
+        user = User.objects.create(username=f'bench{i}', email=f'bench{i}@example.com',
+                                   password=password)
+        SocialAccount.objects.filter(user=user).update(youtube=True, twitter=True)
+        YouTubeCredentials.objects.create(
+            user=user, access_token='bench-access', refresh_token='bench-refresh',
+            token_expiry=far_future, scopes='https://www.googleapis.com/auth/youtube.readonly')
+        TwitterOAuth2Token.objects.create(
+            user=user, access_token='bench-access', refresh_token='bench-refresh',
+            expires_in=7200, expires_at=far_future, scope='tweet.read', token_type='bearer')
+        TwitterCredential.objects.create(
+            user=user, twitter_username=f'bench{i}', access_token='a', access_token_secret='s')
+        start = timezone.now() - timedelta(hours=history)
+        TwitterStats.objects.bulk_create([
+            TwitterStats(user=user, followers_count=1000 + h, tweets_count=300 + h // 10,
+                         likes_count=50 + h, recorded_at=start + timedelta(hours=h))
+            for h in range(history)
+        ])
+        rebuild_rollups(user)
+        seeded.append((user, str(tokens_for_user(user).access_token)))
+    return seeded
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def request_once(method, path, user, token):
+    reset_queries()
+    client = Client()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        if method == 'POST':
+            response = client.post(path, {'username': user.username, 'password': PASSWORD},
+                                   content_type='application/json')
+        else:
+            response = client.get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+        elapsed = time.perf_counter() - started
+    return elapsed, response.status_code, len(queries)
+
+
+def run_endpoint(method, path, users, requests, concurrency):
+    """Fire ``requests`` calls at one endpoint from ``concurrency`` threads."""
+    def task(i):
+        user, token = users[i % len(users)]
+        return request_once(method, path, user, token)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(task, range(requests)))
+    wall = time.perf_counter() - started
+    latencies = sorted(r[0] * 1000 for r in results)
+    return {
+        'requests': requests,
+        'errors': sum(1 for r in results if r[1] >= 400),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.fmean(latencies),
+        'throughput': requests / wall,
+        'queries': statistics.fmean(r[2] for r in results),
+    }
+
+
+def format_report(results):
+    lines = [f"{'endpoint':<18} {'reqs':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} "
+             f"{'p99 ms':>9} {'req/s':>9} {'queries':>8}"]
+    for name, r in results.items():
+        lines.append(
+            f"{name:<18} {r['requests']:>6} {r['errors']:>5} {r['p50']:>9.2f} {r['p95']:>9.2f} "
+            f"{r['p99']:>9.2f} {r['throughput']:>9.1f} {r['queries']:>8.1f}")
+    return "\n".join(lines)
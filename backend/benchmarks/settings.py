@@ -0,0 +1,21 @@
+"""Settings for the app servers started by ``bench_serving``.
+
+The database and the stand-in upstream URLs come from the environment.
+"""
+import os
+from backend.settings import *  # noqa: F401,F403
+from backend.settings import DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES['default']['NAME'] = os.environ['BENCH_DATABASE']
+DATABASES['default']['OPTIONS'] = {'timeout': 30, 'transaction_mode': 'IMMEDIATE'}
+
+TWITTER_API_BASE_URL = os.environ['BENCH_TWITTER_URL']
+YOUTUBE_API_ENDPOINTS = {
+    'youtube': f"{os.environ['BENCH_GOOGLE_URL']}/",
+    'youtubeAnalytics': f"{os.environ['BENCH_GOOGLE_URL']}/",
+}
+# Every load forces a refresh; quotas would turn most of them into 429s
+UPSTREAM_QUOTAS = {}
@@ -0,0 +1,192 @@
+"""Local stand-ins for the Twitter v2 and YouTube Data/Analytics APIs.
+
+Both servers answer the handful of endpoints the app calls with canned,
+well-formed payloads. They add a configurable latency and fail a share of
+requests with 503, so benchmarks can exercise the app without network.
+"""
+import json
+import multiprocessing
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class UpstreamConfig:
+    def __init__(self, latency_ms=50, jitter_ms=10, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def twitter_response(path, query):
+    if path == '/2/oauth2/token':
+        return {"access_token": "bench-access", "refresh_token": "bench-refresh",
+                "expires_in": 7200, "scope": "tweet.read users.read", "token_type": "bearer"}
+    if path == '/2/users/me':
+        return {"data": {"id": "1000", "username": "bench_user", "created_at": "2020-01-01T00:00:00.000Z",
+                         "public_metrics": {"followers_count": 1234, "tweet_count": 321}}}
+    if path.startswith('/2/users/') and path.endswith('/tweets'):
+        if 'since_id' in query:
+            return {"meta": {"result_count": 0}}
+        today = date.today()
+        tweets = [{
+            "id": str(5000 - i),
+            "text": f"Benchmark tweet {i}",
+            "created_at": f"{today - timedelta(days=i % 30)}T12:00:00.000Z",
+            "public_metrics": {"like_count": i, "retweet_count": i // 3,
+                               "reply_count": 1, "quote_count": 0, "impression_count": 10 * i},
+        } for i in range(100)]
+        return {"data": tweets, "meta": {"newest_id": tweets[0]["id"], "result_count": 100}}
+    if path == '/2/tweets':
+        ids = query.get('ids', [''])[0].split(',')
+        return {"data": [{
+            "id": tweet_id, "text": "Benchmark tweet",
+            "created_at": f"{date.today()}T12:00:00.000Z",
+            "public_metrics": {"like_count": 5, "retweet_count": 1},
+        } for tweet_id in ids if tweet_id]}
+    return None
+
+
+# Uploads in the stand-in channel
+UPLOADS = 120
+
+
+def google_response(path, query):
+    if path.endswith('/channels'):
+        return {"items": [{
+            "id": "UCbench",
+            "snippet": {"title": "Bench Channel", "description": "Stand-in channel"},
+            "statistics": {"subscriberCount": "4321", "viewCount": "987654", "videoCount": str(UPLOADS)},
+            "contentDetails": {"relatedPlaylists": {"uploads": "UUbench"}},
+        }]}
+    if path.endswith('/playlistItems'):
+        # Page tokens are offsets into the uploads, newest first
+        start = int(query.get('pageToken', ['0'])[0])
+        end = min(start + min(int(query.get('maxResults', ['5'])[0]), 50), UPLOADS)
+        page = {"items": [{
+            "snippet": {"publishedAt": f"{date.today() - timedelta(days=i)}T12:00:00Z",
+                        "title": f"Video {i}"},
+            "contentDetails": {"videoId": f"vid{i}",
+                               "videoPublishedAt": f"{date.today() - timedelta(days=i)}T12:00:00Z"},
+        } for i in range(start, end)]}
+        if end < UPLOADS:
+            page["nextPageToken"] = str(end)
+        return page
+    if path.endswith('/videos'):
+        ids = query.get('id', [''])[0].split(',')
+        return {"items": [{
+            "id": video_id,
+            "snippet": {"title": f"Video {video_id}",
+                        "publishedAt": f"{date.today() - timedelta(days=int(video_id[3:]))}T12:00:00Z"},
+            "statistics": {"viewCount": str(1000 + int(video_id[3:])), "likeCount": "50",
+                           "commentCount": "7"},
+        } for video_id in ids if video_id]}
+    if path.endswith('/reports'):
+        start = date.fromisoformat(query['startDate'][0])
+        end = date.fromisoformat(query['endDate'][0])
+        days = (end - start).days + 1
+        return {"rows": [[(start + timedelta(days=i)).isoformat(), i % 7, 100 + i, 10 + i % 5, i % 3]
+                         for i in range(days)]}
+    return None
+
+
+def make_handler(responder, config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def handle_request(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            with config.lock:
+                config.requests += 1
+            delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+            time.sleep(max(0.0, delay) / 1000)
+            url = urlparse(self.path)
+            if random.random() < config.error_rate:
+                status, body = 503, {"error": "stand-in upstream failure"}
+            else:
+                body = responder(url.path, parse_qs(url.query))
+                status = 200 if body is not None else 404
+                body = body if body is not None else {"error": "not found"}
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = handle_request
+        do_POST = handle_request
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Serving benchmarks open hundreds of connections at once
+    request_queue_size = 1024
+
+
+class Upstream:
+    def __init__(self, responder, config):
+        self.config = config
+        self.server = Server(('127.0.0.1', 0), make_handler(responder, config))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_upstreams(latency_ms=50, jitter_ms=10, error_rate=0.0):
+    """Start the Twitter and Google stand-ins; returns ``(twitter, google)``."""
+    config = UpstreamConfig(latency_ms, jitter_ms, error_rate)
+    return (Upstream(twitter_response, config).start(),
+            Upstream(google_response, config).start())
+
+
+def _serve(conn, latency_ms, jitter_ms, error_rate):
+    twitter, google = start_upstreams(latency_ms, jitter_ms, error_rate)
+    conn.send((twitter.url, google.url))
+    # Serve until the parent says stop or goes away
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+
+
+@contextmanager
+def upstreams_process(latency_ms=50, jitter_ms=10, error_rate=0.0):
+    """Run the stand-ins in a child process; yields ``(twitter_url, google_url)``.
+
+    Keeps their request handling from competing with the load generator for the GIL.
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve, args=(child, latency_ms, jitter_ms, error_rate), daemon=True)
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        parent.send('stop')
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
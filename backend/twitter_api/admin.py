@@ -1,7 +1,17 @@
 from django.contrib import admin
-from .models import TwitterOAuth2Token
+from .models import TwitterOAuth2Token, TwitterSyncState, Tweet
 
 
 @admin.register(TwitterOAuth2Token)
 class TwitterOAuth2TokenAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(TwitterSyncState)
+class TwitterSyncStateAdmin(admin.ModelAdmin):
+    list_display = ('user', 'username', 'followers_count', 'synced_at')
+
+
+@admin.register(Tweet)
+class TweetAdmin(admin.ModelAdmin):
+    list_display = ('user', 'tweet_id', 'created_at', 'like_count')
@@ -0,0 +1,154 @@
+import time
+import random
+import asyncio
+import logging
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from django.conf import settings
+from api import circuit
+from api.asynchttp import get_client
+from api.metrics import observe_upstream
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# A repeated POST may spend a single-use code or refresh token twice
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class TwitterClient:
+    """Connection-pooled HTTP client shared by all Twitter endpoints.
+
+    Every call has explicit connect/read timeouts. 429 and 5xx responses to
+    idempotent methods are retried with exponential backoff, or until ``x-rate-limit-reset`` when
+    Twitter sends it, as long as the wait fits in ``max_backoff`` seconds
+    and the call's ``deadline``. Otherwise the last response is returned to
+    the caller. Calls go through a circuit breaker per endpoint and raise
+    ``CircuitOpen`` while it is open.
+    """
+
+    def __init__(self, base_url=None, timeout=None, max_retries=None,
+                 max_backoff=None, pool_size=None, deadline=None):
+        self.base_url = (base_url or settings.TWITTER_API_BASE_URL).rstrip('/')
+        self.timeout = timeout or (settings.TWITTER_CONNECT_TIMEOUT,
+                                   settings.TWITTER_READ_TIMEOUT)
+        self.max_retries = settings.TWITTER_MAX_RETRIES if max_retries is None else max_retries
+        self.max_backoff = settings.TWITTER_MAX_BACKOFF if max_backoff is None else max_backoff
+        self.deadline = deadline or settings.TWITTER_REQUEST_DEADLINE
+        self.pool_size = pool_size or settings.TWITTER_POOL_SIZE
+        self.session = self.make_session()
+
+    def make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f"{self.base_url}{path}"
+
+    def retry_delay(self, response, attempt):
+        reset = response.headers.get('x-rate-limit-reset')
+        if response.status_code == 429 and reset:
+            return max(0.0, float(reset) - time.time())
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return (2 ** attempt) * 0.5 + random.uniform(0, 0.25)
+
+    def retries(self, method):
+        return self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url(path)
+        endpoint = urlparse(url).path
+        deadline = time.monotonic() + self.deadline
+        retries = self.retries(method)
+        for attempt in range(retries + 1):
+            circuit.before_call('twitter', endpoint)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                self.record(endpoint, 'error', started)
+                raise
+            self.record(endpoint, response.status_code, started)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            delay = self.retry_delay(response, attempt)
+            if delay > min(self.max_backoff, deadline - time.monotonic()):
+                logger.warning(f'[TwitterClient] {method} {url} returned {response.status_code}; '
+                               f'retry in {delay:.0f}s exceeds backoff budget.')
+                return response
+            time.sleep(delay)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def record(self, endpoint, status, started):
+        observe_upstream('twitter', endpoint, status, time.perf_counter() - started)
+        if status == 'error' or status >= 500:
+            circuit.record_failure('twitter', endpoint)
+        else:
+            circuit.record_success('twitter', endpoint)
+
+
+class AsyncTwitterClient(TwitterClient):
+    """``TwitterClient`` for async views, on httpx with the same retry and breaker policy.
+
+    httpx clients belong to one event loop, so a pool is kept per running loop.
+    """
+
+    def make_session(self):
+        return None
+
+    def http(self):
+        connect, read = self.timeout
+        return get_client('twitter', timeout=httpx.Timeout(read, connect=connect),
+                          limits=httpx.Limits(max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS))
+
+    async def request(self, method, path, **kwargs):
+        url = self.url(path)
+        endpoint = urlparse(url).path
+        deadline = time.monotonic() + self.deadline
+        http = self.http()
+        retries = self.retries(method)
+        for attempt in range(retries + 1):
+            await circuit.abefore_call('twitter', endpoint)
+            started = time.perf_counter()
+            try:
+                response = await http.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                await self.arecord(endpoint, 'error', started)
+                raise
+            await self.arecord(endpoint, response.status_code, started)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            delay = self.retry_delay(response, attempt)
+            if delay > min(self.max_backoff, deadline - time.monotonic()):
+                logger.warning(f'[AsyncTwitterClient] {method} {url} returned {response.status_code}; '
+                               f'retry in {delay:.0f}s exceeds backoff budget.')
+                return response
+            await asyncio.sleep(delay)
+        return response
+
+    async def arecord(self, endpoint, status, started):
+        observe_upstream('twitter', endpoint, status, time.perf_counter() - started)
+        if status == 'error' or status >= 500:
+            await circuit.arecord_failure('twitter', endpoint)
+        else:
+            await circuit.arecord_success('twitter', endpoint)
+
+
+client = TwitterClient()
+async_client = AsyncTwitterClient()
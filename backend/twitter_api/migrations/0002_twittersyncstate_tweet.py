@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter_api', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwitterSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('twitter_user_id', models.CharField(max_length=32)),
+                ('username', models.CharField(blank=True, max_length=255)),
+                ('followers_count', models.IntegerField(default=0)),
+                ('tweet_count', models.IntegerField(default=0)),
+                ('account_created_at', models.CharField(blank=True, max_length=64)),
+                ('newest_tweet_id', models.CharField(blank=True, max_length=32, null=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tweet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tweet_id', models.CharField(max_length=32)),
+                ('text', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('like_count', models.IntegerField(default=0)),
+                ('retweet_count', models.IntegerField(default=0)),
+                ('reply_count', models.IntegerField(default=0)),
+                ('quote_count', models.IntegerField(default=0)),
+                ('impression_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='twitter_api_user_id_ce3d07_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'tweet_id'), name='unique_user_tweet')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter_api', '0002_twittersyncstate_tweet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twitteroauth2token',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -7,9 +7,51 @@ class TwitterOAuth2Token(models.Model):
     access_token = models.CharField(max_length=512)
     refresh_token = models.CharField(max_length=512, blank=True, null=True)
     expires_in = models.IntegerField()
+    expires_at = models.DateTimeField(null=True, blank=True)
     scope = models.CharField(max_length=512)
     token_type = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Failed background refreshes in a row, and when the next may be tried
+    refresh_failures = models.PositiveIntegerField(default=0)
+    refresh_retry_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} Twitter Token"
+
+
+class TwitterSyncState(models.Model):
+    """Cached profile and incremental sync cursor for a connected account."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    twitter_user_id = models.CharField(max_length=32)
+    username = models.CharField(max_length=255, blank=True)
+    followers_count = models.IntegerField(default=0)
+    tweet_count = models.IntegerField(default=0)
+    account_created_at = models.CharField(max_length=64, blank=True)
+    newest_tweet_id = models.CharField(max_length=32, blank=True, null=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} Twitter sync state"
+
+
+class Tweet(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    tweet_id = models.CharField(max_length=32)
+    text = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    like_count = models.IntegerField(default=0)
+    retweet_count = models.IntegerField(default=0)
+    reply_count = models.IntegerField(default=0)
+    quote_count = models.IntegerField(default=0)
+    impression_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tweet_id'], name='unique_user_tweet'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} tweet {self.tweet_id}"
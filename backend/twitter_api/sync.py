@@ -0,0 +1,280 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from api import singleflight, swr
+from api.conditional import make_etag
+from api.quota import BACKGROUND, INTERACTIVE, acharge, charge
+from api.summary import update_summary
+from .client import async_client, client
+from .models import Tweet, TwitterOAuth2Token, TwitterSyncState
+from .tokens import access_token_for
+
+TWEET_FIELDS = "public_metrics,created_at"
+METRIC_FIELDS = ['text', 'like_count', 'retweet_count', 'reply_count',
+                 'quote_count', 'impression_count']
+
+
+class TwitterSyncError(Exception):
+    pass
+
+
+def _get(path, headers, params, quota):
+    api, user_id, priority = quota
+    charge(api, user_id, priority=priority)
+    response = client.get(path, headers=headers, params=params)
+    if response.status_code != 200:
+        raise TwitterSyncError(
+            f"GET {path} failed with status {response.status_code}.")
+    return response.json()
+
+
+def _tweet_row(user_id, tweet):
+    metrics = tweet.get("public_metrics", {})
+    return Tweet(
+        user_id=user_id,
+        tweet_id=tweet["id"],
+        text=tweet.get("text", ""),
+        created_at=datetime.strptime(
+            tweet["created_at"], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=dt_timezone.utc),
+        like_count=metrics.get("like_count", 0),
+        retweet_count=metrics.get("retweet_count", 0),
+        reply_count=metrics.get("reply_count", 0),
+        quote_count=metrics.get("quote_count", 0),
+        # Only available for some accounts
+        impression_count=metrics.get("impression_count", 0),
+    )
+
+
+def store_tweets(user_id, tweets):
+    Tweet.objects.bulk_create(
+        [_tweet_row(user_id, tweet) for tweet in tweets],
+        update_conflicts=True,
+        unique_fields=['user', 'tweet_id'],
+        update_fields=METRIC_FIELDS,
+    )
+
+
+def _start_sync(user_id, profile):
+    state, _ = TwitterSyncState.objects.get_or_create(
+        user_id=user_id, defaults={"twitter_user_id": profile["id"]})
+    if state.twitter_user_id != profile["id"]:
+        # A different account was connected; start over.
+        Tweet.objects.filter(user_id=user_id).delete()
+        state.twitter_user_id = profile["id"]
+        state.newest_tweet_id = None
+    return state
+
+
+def _timeline_params(state):
+    params = {"max_results": 100, "tweet.fields": TWEET_FIELDS}
+    if state.newest_tweet_id:
+        params["since_id"] = state.newest_tweet_id
+    return params
+
+
+def _metric_refresh_ids(user_id, fetched_ids):
+    since = timezone.now() - timedelta(days=settings.TWITTER_METRICS_REFRESH_DAYS)
+    return [
+        tweet_id for tweet_id in Tweet.objects.filter(
+            user_id=user_id, created_at__gte=since).values_list('tweet_id', flat=True)
+        if tweet_id not in fetched_ids
+    ]
+
+
+def _lookup_params(ids):
+    return {"ids": ",".join(ids), "tweet.fields": TWEET_FIELDS}
+
+
+def _finish_sync(state, profile, newest_id):
+    public_metrics = profile.get("public_metrics", {})
+    state.username = profile.get("username", "")
+    state.followers_count = public_metrics.get("followers_count", 0)
+    state.tweet_count = public_metrics.get("tweet_count", 0)
+    state.account_created_at = profile.get("created_at", "")
+    if newest_id:
+        state.newest_tweet_id = newest_id
+    state.synced_at = timezone.now()
+    state.save()
+
+    totals = Tweet.objects.filter(user_id=state.user_id).aggregate(
+        likes=Sum('like_count'), impressions=Sum('impression_count'),
+        retweets=Sum('retweet_count'))
+    update_summary(
+        state.user_id,
+        twitter_followers=state.followers_count,
+        twitter_tweets=state.tweet_count,
+        twitter_impressions=totals['impressions'] or 0,
+        twitter_likes=totals['likes'] or 0,
+        twitter_retweets=totals['retweets'] or 0,
+        twitter_refreshed_at=state.synced_at,
+    )
+    return state
+
+
+def _sync_steps(token, priority):
+    """The sync as a generator shared by ``sync_user`` and ``async_sync_user``.
+
+    Yields ``(path, headers, params, quota)`` for each API call and a
+    ``partial`` for each piece of database work; the driver sends back the
+    JSON body or the result. Returns the updated ``TwitterSyncState``.
+    """
+    user_id = token.user_id
+    access_token = yield partial(access_token_for, token)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    profile = (yield ("/2/users/me", headers, {"user.fields": "public_metrics,created_at"},
+                      ('twitter:users/me', user_id, priority))).get("data", {})
+    state = yield partial(_start_sync, user_id, profile)
+
+    params = _timeline_params(state)
+    newest_id, fetched_ids = None, set()
+    for _ in range(settings.TWITTER_SYNC_MAX_PAGES):
+        page = yield (f"/2/users/{state.twitter_user_id}/tweets", headers, params,
+                      ('twitter:users/tweets', user_id, priority))
+        meta = page.get("meta", {})
+        newest_id = newest_id or meta.get("newest_id")
+        tweets = page.get("data", [])
+        yield partial(store_tweets, user_id, tweets)
+        fetched_ids.update(tweet["id"] for tweet in tweets)
+        if not meta.get("next_token"):
+            break
+        params["pagination_token"] = meta["next_token"]
+
+    recent_ids = yield partial(_metric_refresh_ids, user_id, fetched_ids)
+    for i in range(0, len(recent_ids), 100):
+        page = yield ("/2/tweets", headers, _lookup_params(recent_ids[i:i + 100]),
+                      ('twitter:tweets', user_id, priority))
+        yield partial(store_tweets, user_id, page.get("data", []))
+
+    return (yield partial(_finish_sync, state, profile, newest_id))
+
+
+def sync_user(token, priority=INTERACTIVE):
+    """Pull the profile, new tweets since the last sync and recent metric changes.
+
+    New tweets are paged with ``since_id``/``pagination_token``, so each
+    sync only downloads what was posted since the previous one. Tweets
+    younger than ``TWITTER_METRICS_REFRESH_DAYS`` get their public_metrics
+    refreshed through the batched tweet lookup endpoint. Every call is
+    charged against the per-endpoint quota for ``priority``.
+    """
+    steps, result = _sync_steps(token, priority), None
+    try:
+        while True:
+            step = steps.send(result)
+            result = step() if callable(step) else _get(*step)
+    except StopIteration as done:
+        return done.value
+
+
+async def _aget(path, headers, params, quota):
+    api, user_id, priority = quota
+    await acharge(api, user_id, priority=priority)
+    response = await async_client.get(path, headers=headers, params=params)
+    if response.status_code != 200:
+        raise TwitterSyncError(
+            f"GET {path} failed with status {response.status_code}.")
+    return response.json()
+
+
+async def async_sync_user(token, priority=INTERACTIVE):
+    """``sync_user`` for async views: HTTP on the event loop, ORM work in threads."""
+    steps, result = _sync_steps(token, priority), None
+    try:
+        while True:
+            step = steps.send(result)
+            result = await (sync_to_async(step)() if callable(step) else _aget(*step))
+    except StopIteration as done:
+        return done.value
+
+
+def is_stale(state):
+    return state is None or state.synced_at is None or (
+        timezone.now() - state.synced_at).total_seconds() > settings.TWITTER_SYNC_INTERVAL
+
+
+def fresh_state(user):
+    """The user's sync state if it is up to date, else ``None``."""
+    state = TwitterSyncState.objects.filter(user=user).first()
+    return None if is_stale(state) else state
+
+
+def build_trends(user, days=30):
+    """Daily tweet totals for the last ``days`` days, from stored tweets."""
+    today = timezone.now().date()
+    start = today - timedelta(days=days - 1)
+    rows = {
+        row["day"]: row for row in Tweet.objects.filter(
+            user=user, created_at__date__gte=start)
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(tweets=Count('id'), views=Sum('impression_count'),
+                  likes=Sum('like_count'), retweets=Sum('retweet_count'))
+    }
+    trend_list = []
+    for i in range(days):
+        date = start + timedelta(days=i)
+        row = rows.get(date, {})
+        trend_list.append({
+            "date": date.isoformat(),
+            "tweets": row.get("tweets", 0),
+            "views": row.get("views", 0),
+            "likes": row.get("likes", 0),
+            "retweets": row.get("retweets", 0),
+        })
+    return trend_list
+
+
+def recent_tweets(user, limit=10):
+    return [
+        {
+            "id": tweet.tweet_id,
+            "text": tweet.text,
+            "created_at": tweet.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "public_metrics": {
+                "like_count": tweet.like_count,
+                "retweet_count": tweet.retweet_count,
+            },
+        } for tweet in Tweet.objects.filter(user=user).order_by('-created_at')[:limit]
+    ]
+
+
+def stats_etag(user_id, synced_at):
+    # Trends are windowed on today's date, so it is part of the version
+    return make_etag('twitter-stats', user_id, synced_at.timestamp(), timezone.localdate())
+
+
+def stats_entry(user_id, state):
+    """Stats payload for ``state`` with its validators."""
+    etag = stats_etag(user_id, state.synced_at)
+    payload = {
+        "profile": {
+            "username": state.username,
+            "followers_count": state.followers_count,
+            "tweets_count": state.tweet_count,
+            "created_at": state.account_created_at,
+        },
+        "tweets": recent_tweets(user_id),
+        "trends": build_trends(user_id),
+        "last_refreshed": state.synced_at.isoformat(),
+    }
+    return {'payload': payload, 'etag': etag, 'last_modified': state.synced_at}
+
+
+def cache_state(user_id, state):
+    """Build the stats payload for ``state`` and store it in the response cache."""
+    return swr.store('twitter', user_id, **stats_entry(user_id, state))
+
+
+def revalidate(user_id):
+    """Background rebuild of the cached payload, syncing first if the data is due."""
+    state = TwitterSyncState.objects.filter(user_id=user_id).first()
+    if is_stale(state):
+        token = TwitterOAuth2Token.objects.select_related('user').get(user_id=user_id)
+        state = singleflight.do(
+            ('twitter', 'stats', user_id), lambda: sync_user(token, priority=BACKGROUND),
+            reload=lambda: fresh_state(user_id))
+    return cache_state(user_id, state)
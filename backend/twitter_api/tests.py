@@ -1,3 +1,248 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api import swr
+from api.circuit import CircuitOpen
+from api.quota import charge
+from .client import AsyncTwitterClient, TwitterClient
+from .models import Tweet, TwitterOAuth2Token, TwitterSyncState
+from .sync import async_sync_user, sync_user
+from .tokens import TokenRefreshError, refresh_expiring, refresh_token
 
-# Create your tests here.
+
+@override_settings(UPSTREAM_QUOTAS={'twitter:users/me': {'user': (1, 900)}})
+class StatsQuotaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('heidi', password='secret')
+        TwitterOAuth2Token.objects.create(
+            user=self.user, access_token='access', refresh_token='refresh', expires_in=7200,
+            expires_at=timezone.now() + timedelta(hours=2), scope='users.read', token_type='bearer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Drain the user's bucket
+        charge('twitter:users/me', self.user.id)
+
+    def test_exhausted_quota_without_data_is_429(self):
+        with mock.patch('twitter_api.sync.async_client.get') as get:
+            response = self.client.get('/twitter/stats/')
+        get.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 800)
+
+    def test_exhausted_quota_serves_stored_data_as_stale(self):
+        TwitterSyncState.objects.create(user=self.user, twitter_user_id='1000', followers_count=5,
+                                        synced_at=timezone.now() - timedelta(hours=1))
+        response = self.client.get('/twitter/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.data['stale'], True)
+        # The stale fallback is not cached as a fresh payload
+        self.assertIs(self.client.get('/twitter/stats/').data['stale'], True)
+
+
+def token_response(status_code=200, access='new-access', refresh='new-refresh'):
+    return SimpleNamespace(status_code=status_code, json=lambda: {
+        "access_token": access, "refresh_token": refresh, "expires_in": 7200})
+
+
+@override_settings(OAUTH_REFRESH_INTERVAL=60, OAUTH_REFRESH_MAX_BACKOFF=3600)
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ivan', password='secret')
+        self.token = TwitterOAuth2Token.objects.create(
+            user=self.user, access_token='access', refresh_token='refresh', expires_in=7200,
+            expires_at=timezone.now() + timedelta(minutes=1), scope='users.read', token_type='bearer')
+
+    def test_refresh_replaces_the_stored_tokens(self):
+        with mock.patch('twitter_api.tokens.client.post', return_value=token_response()):
+            refresh_token(self.token)
+        stored = TwitterOAuth2Token.objects.get(pk=self.token.pk)
+        self.assertEqual((stored.access_token, stored.refresh_token), ('new-access', 'new-refresh'))
+
+    def test_stale_write_loses_to_the_stored_tokens(self):
+        def winner_first(*args, **kwargs):
+            TwitterOAuth2Token.objects.filter(pk=self.token.pk).update(access_token='winner')
+            return token_response(access='loser')
+
+        with mock.patch('twitter_api.tokens.client.post', side_effect=winner_first):
+            refresh_token(self.token)
+        self.assertEqual(self.token.access_token, 'winner')
+        self.assertEqual(TwitterOAuth2Token.objects.get(pk=self.token.pk).access_token, 'winner')
+
+    def test_spent_refresh_token_reloads_the_winner(self):
+        TwitterOAuth2Token.objects.filter(pk=self.token.pk).update(
+            access_token='winner', expires_at=timezone.now() + timedelta(hours=2))
+        with mock.patch('twitter_api.tokens.client.post', return_value=token_response(400)):
+            refresh_token(self.token)
+        self.assertEqual(self.token.access_token, 'winner')
+
+    def test_rejected_refresh_backs_off(self):
+        with mock.patch('twitter_api.tokens.client.post', return_value=token_response(400)) as post:
+            with self.assertRaises(TokenRefreshError):
+                refresh_token(self.token)
+            self.assertEqual(refresh_expiring(), (0, 1))
+            self.assertEqual(refresh_expiring(), (0, 0))
+        self.assertEqual(post.call_count, 2)
+        stored = TwitterOAuth2Token.objects.get(pk=self.token.pk)
+        self.assertEqual(stored.refresh_failures, 1)
+        self.assertGreater(stored.refresh_retry_at, timezone.now() + timedelta(seconds=100))
+
+
+def http_response(status_code, **headers):
+    return SimpleNamespace(status_code=status_code, headers=headers)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   CIRCUIT_FAILURE_THRESHOLD=3)
+class TwitterClientRetryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = TwitterClient(base_url='https://api.test', max_retries=2, max_backoff=5, deadline=15)
+        self.client.session = mock.Mock()
+        patcher = mock.patch('twitter_api.client.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def respond(self, *responses):
+        self.client.session.request.side_effect = responses
+
+    def test_rate_limit_waits_until_reset(self):
+        with mock.patch('twitter_api.client.time.time', return_value=1000.0):
+            self.respond(http_response(429, **{'x-rate-limit-reset': '1003'}), http_response(200))
+            response = self.client.get('/2/users/me')
+        self.assertEqual(response.status_code, 200)
+        self.sleep.assert_called_once_with(3.0)
+
+    def test_rate_limit_reset_beyond_the_backoff_budget_is_returned(self):
+        with mock.patch('twitter_api.client.time.time', return_value=1000.0):
+            self.respond(http_response(429, **{'x-rate-limit-reset': '1900'}))
+            response = self.client.get('/2/users/me')
+        self.assertEqual(response.status_code, 429)
+        self.sleep.assert_not_called()
+
+    def test_server_errors_are_retried_until_exhausted(self):
+        self.respond(*[http_response(503)] * 3)
+        self.assertEqual(self.client.get('/2/users/me').status_code, 503)
+        self.assertEqual(self.client.session.request.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        # Every failed attempt counted towards the endpoint's breaker
+        with self.assertRaises(CircuitOpen):
+            self.client.get('/2/users/me')
+        self.assertEqual(self.client.session.request.call_count, 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.respond(http_response(404))
+        self.assertEqual(self.client.get('/2/users/me').status_code, 404)
+        self.assertEqual(self.client.session.request.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_posts_are_not_retried(self):
+        # A token POST may have rotated the refresh token before the 503
+        self.respond(http_response(503), http_response(200))
+        self.assertEqual(self.client.post('/2/oauth2/token').status_code, 503)
+        self.assertEqual(self.client.session.request.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_async_client_follows_the_same_policy(self):
+        client = AsyncTwitterClient(base_url='https://api.test', max_retries=2, max_backoff=5, deadline=15)
+        http = mock.Mock(request=mock.AsyncMock(side_effect=[http_response(502), http_response(200)]))
+        with mock.patch.object(client, 'http', return_value=http), \
+                mock.patch('twitter_api.client.asyncio.sleep', new=mock.AsyncMock()) as sleep:
+            response = asyncio.run(client.get('/2/users/me'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(http.request.call_count, 2)
+        sleep.assert_awaited_once()
+
+
+class FakeTimeline:
+    """Answers the v2 endpoints the sync calls: three tweets over two pages."""
+
+    def __init__(self):
+        self.calls = []
+        created = (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        self.tweets = [{"id": str(i), "text": f"tweet {i}", "created_at": created,
+                        "public_metrics": {"like_count": i}} for i in (3, 2, 1)]
+
+    def __call__(self, path, headers=None, params=None):
+        self.calls.append((path, dict(params or {})))
+        if path == '/2/users/me':
+            body = {"data": {"id": "1000", "username": "ivan",
+                             "public_metrics": {"followers_count": 10, "tweet_count": 3}}}
+        elif path == '/2/tweets':
+            body = {"data": [{**tweet, "public_metrics": {"like_count": 50}}
+                             for tweet in self.tweets if tweet["id"] in params["ids"].split(',')]}
+        elif 'since_id' in params:
+            body = {"meta": {"result_count": 0}}
+        elif 'pagination_token' not in params:
+            body = {"data": self.tweets[:2], "meta": {"newest_id": "3", "next_token": "p2"}}
+        else:
+            body = {"data": self.tweets[2:], "meta": {"newest_id": "1"}}
+        return SimpleNamespace(status_code=200, json=lambda: body)
+
+    def timeline_params(self):
+        return [params for path, params in self.calls if path.endswith('/tweets') and path != '/2/tweets']
+
+
+@override_settings(UPSTREAM_QUOTAS={})
+class IncrementalSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('leo', password='secret')
+        self.token = TwitterOAuth2Token.objects.create(
+            user=self.user, access_token='access', refresh_token='refresh', expires_in=7200,
+            expires_at=timezone.now() + timedelta(hours=2), scope='users.read', token_type='bearer')
+        self.twitter = FakeTimeline()
+
+    def test_first_sync_pages_through_the_timeline(self):
+        with mock.patch('twitter_api.sync.client.get', side_effect=self.twitter):
+            state = sync_user(self.token)
+        pages = self.twitter.timeline_params()
+        self.assertEqual([p.get('pagination_token') for p in pages], [None, 'p2'])
+        self.assertNotIn('since_id', pages[0])
+        self.assertEqual(Tweet.objects.filter(user=self.user).count(), 3)
+        # The newest id comes from the first page, not the last one
+        self.assertEqual(TwitterSyncState.objects.get(pk=state.pk).newest_tweet_id, '3')
+
+    def test_next_sync_starts_after_the_newest_tweet(self):
+        with mock.patch('twitter_api.sync.client.get', side_effect=self.twitter):
+            sync_user(self.token)
+            self.twitter.calls.clear()
+            state = sync_user(self.token)
+        pages = self.twitter.timeline_params()
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0]['since_id'], '3')
+        # An empty page keeps the cursor and still refreshes recent metrics
+        self.assertEqual(state.newest_tweet_id, '3')
+        self.assertEqual(set(Tweet.objects.values_list('like_count', flat=True)), {50})
+
+    async def test_async_sync_matches(self):
+        get = mock.AsyncMock(side_effect=self.twitter)
+        with mock.patch('twitter_api.sync.async_client.get', new=get):
+            await async_sync_user(self.token)
+            await async_sync_user(self.token)
+        self.assertEqual([p.get('since_id') for p in self.twitter.timeline_params()], [None, None, '3'])
+        self.assertEqual(await Tweet.objects.filter(user=self.user).acount(), 3)
+
+
+class ConditionalStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('mia', password='secret')
+        TwitterSyncState.objects.create(user=self.user, twitter_user_id='1000', synced_at=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_state_is_304_without_building_the_payload(self):
+        etag = self.client.get('/twitter/stats/')['ETag']
+        swr.invalidate('twitter', self.user.id)
+        with mock.patch('twitter_api.views.cache_state') as cache_state:
+            response = self.client.get('/twitter/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        cache_state.assert_not_called()
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from api import oauth
+from .client import client
+from .models import TwitterOAuth2Token
+
+TOKEN_URL = "/2/oauth2/token"
+
+
+class TokenRefreshError(Exception):
+    pass
+
+
+def expires_soon(token, margin=None):
+    margin = settings.OAUTH_REFRESH_MARGIN if margin is None else margin
+    return token.expires_at is None or (
+        token.expires_at <= timezone.now() + timedelta(seconds=margin))
+
+
+def refresh_token(token):
+    """Exchange the refresh token for a new access token and persist both.
+
+    Twitter refresh tokens are single use, so the write only applies if the
+    stored access token is still the one being replaced. When another
+    process won the race, Twitter rejects our already-spent refresh token;
+    the winner's tokens are reloaded instead. ``token`` is updated in place.
+    """
+    response = client.post(TOKEN_URL, data={
+        "grant_type": "refresh_token",
+        "refresh_token": token.refresh_token,
+        "client_id": settings.TWITTER_CLIENT_ID,
+    }, auth=(settings.TWITTER_CLIENT_ID, settings.TWITTER_CLIENT_SECRET))
+    if response.status_code != 200:
+        stored = TwitterOAuth2Token.objects.filter(pk=token.pk).values(
+            'access_token', 'expires_at').first()
+        if stored is not None and (stored['access_token'], stored['expires_at']) != (
+                token.access_token, token.expires_at):
+            token.refresh_from_db()
+            return token
+        raise TokenRefreshError(
+            f"Twitter token refresh failed with status {response.status_code}.")
+    token_data = response.json()
+    fields = {
+        "access_token": token_data["access_token"],
+        "refresh_token": token_data.get("refresh_token", token.refresh_token),
+        "expires_in": token_data["expires_in"],
+        "expires_at": timezone.now() + timedelta(seconds=token_data["expires_in"]),
+        "scope": token_data.get("scope", token.scope),
+        "refresh_failures": 0,
+        "refresh_retry_at": None,
+    }
+    updated = TwitterOAuth2Token.objects.filter(
+        pk=token.pk, access_token=token.access_token).update(**fields)
+    if updated:
+        for name, value in fields.items():
+            setattr(token, name, value)
+    else:
+        token.refresh_from_db()
+    return token
+
+
+def access_token_for(token):
+    """A usable access token, refreshed inline only if the background refresher fell behind."""
+    if token.refresh_token and token.expires_at and expires_soon(token, margin=60):
+        refresh_token(token)
+    return token.access_token
+
+
+def refresh_expiring(margin=None):
+    """Refresh every stored token that expires within ``margin`` seconds."""
+    return oauth.refresh_expiring(
+        TwitterOAuth2Token.objects.all(), 'expires_at', refresh_token, 'Twitter', margin)
@@ -1,13 +1,27 @@
-from datetime import timedelta
 import secrets
 import base64
 import hashlib
-import requests
-from datetime import datetime
+from datetime import timedelta
 from django.conf import settings
+from django.utils import timezone
 from urllib.parse import urlencode
+import httpx
+from asgiref.sync import sync_to_async
+from requests import RequestException
 from api.models import SocialAccount
-from .models import TwitterOAuth2Token
+from api import singleflight, swr
+from api.asyncview import AsyncAPIView
+from api.circuit import CircuitOpen
+from api.conditional import not_modified
+from api.quota import QuotaExceeded
+from api.summary import clear_platform
+from .client import client
+from .models import TwitterOAuth2Token, TwitterSyncState, Tweet
+from .tokens import TOKEN_URL, TokenRefreshError
+from .sync import (
+    TwitterSyncError, async_sync_user, cache_state, fresh_state, is_stale, revalidate, stats_entry,
+    stats_etag,
+)
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -18,7 +32,6 @@ TWITTER_CLIENT_SECRET = settings.TWITTER_CLIENT_SECRET
 TWITTER_CALLBACK_URL = settings.TWITTER_CALLBACK_URL
 
 AUTH_URL = "https://twitter.com/i/oauth2/authorize"
-TOKEN_URL = "https://api.twitter.com/2/oauth2/token"
 SCOPES = [
     "tweet.read", "tweet.write", "tweet.moderate.write",
     "users.read", "follows.read", "follows.write",
@@ -72,8 +85,11 @@ class TwitterAuthCallbackView(APIView):
             "code_verifier": code_verifier,
         }
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        response = requests.post(TOKEN_URL, data=data, headers=headers, auth=(
-            TWITTER_CLIENT_ID, TWITTER_CLIENT_SECRET))
+        try:
+            response = client.post(TOKEN_URL, data=data, headers=headers, auth=(
+                TWITTER_CLIENT_ID, TWITTER_CLIENT_SECRET))
+        except (RequestException, CircuitOpen) as e:
+            return HttpResponse(f"Token exchange failed: {e}", status=400)
         if response.status_code != 200:
             return HttpResponse(f"Token exchange failed: {response.text}", status=400)
         token_data = response.json()
@@ -87,10 +103,14 @@ class TwitterAuthCallbackView(APIView):
                 "access_token": token_data["access_token"],
                 "refresh_token": token_data.get("refresh_token"),
                 "expires_in": token_data["expires_in"],
+                "expires_at": timezone.now() + timedelta(seconds=token_data["expires_in"]),
                 "scope": token_data["scope"],
                 "token_type": token_data["token_type"],
+                "refresh_failures": 0,
+                "refresh_retry_at": None,
             }
         )
+        swr.invalidate('twitter', user.id)
         social_account, _ = SocialAccount.objects.get_or_create(user=user)
         if not social_account.twitter:
             social_account.twitter = True
@@ -103,111 +123,62 @@ class TwitterAuthCallbackView(APIView):
         """)
 
 
-class TwitterStatsView(APIView):
+class TwitterStatsView(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        try:
-            token = TwitterOAuth2Token.objects.get(user=request.user)
-        except TwitterOAuth2Token.DoesNotExist:
-            return Response({"detail": "Not connected."}, status=400)
-
-        headers = {
-            "Authorization": f"Bearer {token.access_token}"
-        }
-
-        # 1. Get user info
-        user_resp = requests.get(
-            "https://api.twitter.com/2/users/me?user.fields=public_metrics,created_at",
-            headers=headers
-        )
-        if user_resp.status_code != 200:
-            return Response({"detail": "Failed to fetch Twitter user info."}, status=400)
-        user_data = user_resp.json().get("data", {})
-
-        user_id = user_data["id"]
-        followers_count = user_data.get(
-            "public_metrics", {}).get("followers_count", 0)
-        tweets_count = user_data.get(
-            "public_metrics", {}).get("tweet_count", 0)
-        created_at = user_data.get("created_at", "")
-
-        # 2. Get recent tweets (max 100)
-        tweets_resp = requests.get(
-            f"https://api.twitter.com/2/users/{user_id}/tweets?max_results=100&tweet.fields=public_metrics,created_at",
-            headers=headers
-        )
-        tweets_data = tweets_resp.json().get(
-            "data", []) if tweets_resp.status_code == 200 else []
-
-        # 3. Aggregate tweet stats for trends
-        # We'll build daily stats for the last 30 days
-        from collections import defaultdict
-
-        trends = defaultdict(
-            lambda: {"tweets": 0, "views": 0, "likes": 0, "retweets": 0})
-        for tweet in tweets_data:
-            dt = datetime.strptime(
-                tweet["created_at"], "%Y-%m-%dT%H:%M:%S.%fZ").date()
-            metrics = tweet.get("public_metrics", {})
-            trends[dt]["tweets"] += 1
-            # Only available for some accounts
-            trends[dt]["views"] += metrics.get("impression_count", 0)
-            trends[dt]["likes"] += metrics.get("like_count", 0)
-            trends[dt]["retweets"] += metrics.get("retweet_count", 0)
-
-        # Prepare trends for charting
-        # trend_list = []
-
-        # for date in sorted(trends.keys()):
-        #     trend_list.append({
-        #         "date": date.isoformat(),
-        #         "tweets": trends[date]["tweets"],
-        #         "views": trends[date]["views"],
-        #         "likes": trends[date]["likes"],
-        #         "retweets": trends[date]["retweets"],
-        #     })
-
-        # 4. Prepare response
-        # ...existing code...
-
-        # Simulate 7 days of trends for demo
-
-        trend_list = []
-        today = datetime.utcnow().date()
-        for i in range(7):
-            date = today - timedelta(days=6 - i)
-            trend_list.append({
-                "date": date.isoformat(),
-                "tweets": 2 + i,
-                "views": 100 + i * 20,
-                "likes": 5 + i * 3,
-                "retweets": 1 + i % 2,
-            })
-
-        return Response({
-            "profile": {
-                "username": user_data.get("username", "demo_user"),
-                "followers_count": followers_count,
-                "tweets_count": tweets_count,
-                "created_at": created_at,
-            },
-            "tweets": [
-                {
-                    "id": "1",
-                    "text": "Hello Twitter!",
-                    "created_at": "2024-06-01T10:00:00Z",
-                    "public_metrics": {"like_count": 10, "retweet_count": 2}
-                },
-                {
-                    "id": "2",
-                    "text": "Another tweet!",
-                    "created_at": "2024-06-02T11:00:00Z",
-                    "public_metrics": {"like_count": 8, "retweet_count": 1}
-                }
-            ],
-            "trends": trend_list,
-        })
+    async def get(self, request):
+        entry, state = await swr.alookup('twitter', request.user.id)
+        if state == swr.STALE:
+            swr.revalidate('twitter', request.user.id, lambda: revalidate(request.user.id))
+        if entry is not None:
+            return swr.respond(request, entry)
+        # A synced state that needs no refresh is its own version stamp: an
+        # unchanged one is answered with a 304 before the payload is built.
+        state = await TwitterSyncState.objects.filter(user_id=request.user.id).afirst()
+        if not is_stale(state):
+            cached = not_modified(request, stats_etag(request.user.id, state.synced_at), state.synced_at)
+            if cached is not None:
+                return cached
+        return await self.fetch(request, state=state)
+
+    async def post(self, request):
+        """Explicit refresh: drop the cached payload and sync now."""
+        await swr.ainvalidate('twitter', request.user.id)
+        return await self.fetch(request, force=True)
+
+    async def fetch(self, request, force=False, state=None):
+        user_id = request.user.id
+        if state is None:
+            state = await TwitterSyncState.objects.filter(user_id=user_id).afirst()
+        stale = False
+        if force or is_stale(state):
+            try:
+                token = await TwitterOAuth2Token.objects.aget(user_id=user_id)
+            except TwitterOAuth2Token.DoesNotExist:
+                return Response({"detail": "Not connected."}, status=400)
+            try:
+                state = await singleflight.ado(
+                    ('twitter', 'stats', user_id), lambda: async_sync_user(token),
+                    reload=lambda: sync_to_async(fresh_state)(user_id))
+            except QuotaExceeded as e:
+                if state is None or state.synced_at is None:
+                    return Response({"detail": str(e)}, status=429,
+                                    headers={"Retry-After": str(int(e.retry_after) + 1)})
+                stale = True
+            except CircuitOpen as e:
+                if state is None or state.synced_at is None:
+                    return Response({"detail": str(e)}, status=503,
+                                    headers={"Retry-After": str(int(e.retry_after) + 1)})
+                stale = True
+            except (TwitterSyncError, TokenRefreshError, RequestException, httpx.HTTPError,
+                    TimeoutError):
+                # Serve what we already have rather than failing the page
+                if state is None or state.synced_at is None:
+                    return Response({"detail": "Failed to fetch Twitter user info."}, status=400)
+                stale = True
+        if stale:
+            return swr.respond(request, await sync_to_async(stats_entry)(user_id, state), stale=True)
+        return swr.respond(request, await sync_to_async(cache_state)(user_id, state))
 
 
 class TwitterDisconnectView(APIView):
@@ -215,6 +186,10 @@ class TwitterDisconnectView(APIView):
 
     def post(self, request):
         TwitterOAuth2Token.objects.filter(user=request.user).delete()
+        TwitterSyncState.objects.filter(user=request.user).delete()
+        Tweet.objects.filter(user=request.user).delete()
+        clear_platform(request.user.id, 'twitter')
+        swr.invalidate('twitter', request.user.id)
         social_account, _ = SocialAccount.objects.get_or_create(
             user=request.user)
         social_account.twitter = False
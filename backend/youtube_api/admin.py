@@ -1,8 +1,23 @@
 from django.contrib import admin
-from .models import YouTubeCredentials
+from .models import ChannelDailyMetrics, Video, YouTubeCredentials, YouTubeStats
 # Register your models here.
 
 
 @admin.register(YouTubeCredentials)
 class YouTubeCredentialsAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(YouTubeStats)
+class YouTubeStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'title', 'subscribers', 'views', 'refreshed_at')
+
+
+@admin.register(ChannelDailyMetrics)
+class ChannelDailyMetricsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'channel_id', 'date', 'subscribers_gained', 'views', 'likes', 'comments')
+
+
+@admin.register(Video)
+class VideoAdmin(admin.ModelAdmin):
+    list_display = ('user', 'title', 'published_at', 'views', 'likes', 'comments')
@@ -0,0 +1,97 @@
+"""Compact per-video statistics history: one row per video and UTC day.
+
+A row's ``samples`` blob holds the day's samples column by column
+(seconds since midnight, views, likes, comments), each value stored as
+the int64 delta from the previous sample and the whole zlib-compressed.
+Counters move little between refreshes, so the deltas are small and
+compress to a few bytes per sample. Decoding stays in C: ``zlib``,
+``array.frombytes`` and ``itertools.accumulate``.
+"""
+import sys
+import zlib
+from array import array
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import accumulate, chain
+from operator import sub
+from django.utils import timezone
+from .models import VideoStatsDay
+
+COLUMNS = ('seconds', 'views', 'likes', 'comments')
+
+
+def encode(columns):
+    """Pack equal-length ``(seconds, views, likes, comments)`` sequences into a blob."""
+    packed = array('q')
+    for values in columns:
+        packed.extend(map(sub, values, chain([0], values)))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return zlib.compress(packed.tobytes())
+
+
+def decode(blob):
+    """The ``(seconds, views, likes, comments)`` columns of a blob, as lists."""
+    packed = array('q')
+    packed.frombytes(zlib.decompress(blob))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    n = len(packed) // len(COLUMNS)
+    return tuple(list(accumulate(packed[i * n:(i + 1) * n])) for i in range(len(COLUMNS)))
+
+
+def append(blob, seconds, views, likes, comments):
+    columns = decode(blob) if blob else ([], [], [], [])
+    for column, value in zip(columns, (seconds, views, likes, comments)):
+        column.append(value)
+    return encode(columns)
+
+
+def _midnight(day):
+    return datetime.combine(day, time(), dt_timezone.utc)
+
+
+def record_samples(samples, at=None):
+    """Append ``(video_pk, views, likes, comments)`` samples taken at ``at`` to their day rows."""
+    if not samples:
+        return
+    at = at or timezone.now()
+    day = at.astimezone(dt_timezone.utc).date()
+    seconds = int((at - _midnight(day)).total_seconds())
+    existing = dict(VideoStatsDay.objects.filter(
+        video_id__in=[sample[0] for sample in samples], date=day,
+    ).values_list('video_id', 'samples'))
+    VideoStatsDay.objects.bulk_create(
+        [VideoStatsDay(video_id=pk, date=day,
+                       samples=append(existing.get(pk), seconds, views, likes, comments))
+         for pk, views, likes, comments in samples],
+        update_conflicts=True,
+        unique_fields=['video', 'date'],
+        update_fields=['samples'],
+    )
+
+
+def video_histories(video_ids, start, end):
+    """``{video_pk: [(sampled_at, views, likes, comments), ...]}`` for days ``start``..``end``."""
+    histories = defaultdict(list)
+    rows = VideoStatsDay.objects.filter(
+        video_id__in=video_ids, date__range=(start, end),
+    ).order_by('video_id', 'date').values_list('video_id', 'date', 'samples')
+    for pk, day, blob in rows.iterator():
+        midnight = _midnight(day)
+        seconds, views, likes, comments = decode(blob)
+        histories[pk] += zip((midnight + timedelta(seconds=s) for s in seconds),
+                             views, likes, comments)
+    return dict(histories)
+
+
+def daily_closes(video_ids, start, end):
+    """Each video's last sample of every day: ``{video_pk: [(date, views, likes, comments)]}``."""
+    closes = defaultdict(list)
+    rows = VideoStatsDay.objects.filter(
+        video_id__in=video_ids, date__range=(start, end),
+    ).order_by('video_id', 'date').values_list('video_id', 'date', 'samples')
+    for pk, day, blob in rows.iterator():
+        _, views, likes, comments = decode(blob)
+        closes[pk].append((day, views[-1], likes[-1], comments[-1]))
+    return dict(closes)
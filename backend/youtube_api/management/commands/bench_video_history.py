@@ -0,0 +1,149 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from benchmarks.harness import test_database
+from youtube_api.history import daily_closes, encode, video_histories
+from youtube_api.models import Video, VideoStatsDay
+
+# What a row per video per refresh would look like as a Django model
+NAIVE_TABLE = """
+    CREATE TABLE bench_video_stats_sample (
+        id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        video_id bigint NOT NULL,
+        sampled_at datetime NOT NULL,
+        views bigint NOT NULL,
+        likes bigint NOT NULL,
+        comments bigint NOT NULL
+    )
+"""
+NAIVE_INDEX = "CREATE INDEX bench_video_stats_sample_idx ON bench_video_stats_sample (video_id, sampled_at)"
+
+
+def generate(video_ids, days, per_day):
+    """Growing counters per video: ``{pk: [(sampled_at, views, likes, comments)]}``."""
+    start = datetime.now(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - \
+        timedelta(days=days - 1)
+    step = 86400 // per_day
+    series = {}
+    for pk in video_ids:
+        views, likes, comments = random.randint(0, 10 ** 6), random.randint(0, 10 ** 4), 0
+        samples = []
+        for i in range(days * per_day):
+            views += random.randint(0, 500)
+            likes += random.randint(0, 20)
+            comments += random.randint(0, 3)
+            samples.append((start + timedelta(seconds=i * step + random.randint(0, 59)),
+                            views, likes, comments))
+        series[pk] = samples
+    return series
+
+
+def table_bytes(*names):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({', '.join(['%s'] * len(names))})", names)
+        return cursor.fetchone()[0] or 0
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ("Compare the packed per-day video stats history with one row per sample: "
+            "storage size, write time and scan speed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=500)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--samples-per-day', type=int, default=24,
+                            help="Refreshes per day (the default refresher runs every 15 minutes: 96).")
+
+    def handle(self, *args, **options):
+        with test_database():
+            user = User.objects.create(username='history-bench')
+            Video.objects.bulk_create([
+                Video(user=user, channel_id='UCbench', video_id=f'vid{i}')
+                for i in range(options['videos'])])
+            video_ids = list(Video.objects.values_list('pk', flat=True))
+            series = generate(video_ids, options['days'], options['samples_per_day'])
+            first = min(samples[0][0] for samples in series.values()).date()
+            last = max(samples[-1][0] for samples in series.values()).date()
+
+            def write_naive():
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(NAIVE_TABLE)
+                    cursor.execute(NAIVE_INDEX)
+                    cursor.executemany(
+                        "INSERT INTO bench_video_stats_sample "
+                        "(video_id, sampled_at, views, likes, comments) VALUES (%s, %s, %s, %s, %s)",
+                        [(pk, connection.ops.adapt_datetimefield_value(at), views, likes, comments)
+                         for pk, samples in series.items()
+                         for at, views, likes, comments in samples])
+
+            def write_packed():
+                rows = []
+                for pk, samples in series.items():
+                    by_day = {}
+                    for at, views, likes, comments in samples:
+                        by_day.setdefault(at.date(), []).append((at, views, likes, comments))
+                    for day, day_samples in by_day.items():
+                        midnight = datetime.combine(day, datetime.min.time(), dt_timezone.utc)
+                        columns = list(zip(*day_samples))
+                        columns[0] = [int((at - midnight).total_seconds()) for at in columns[0]]
+                        rows.append(VideoStatsDay(video_id=pk, date=day, samples=encode(columns)))
+                with transaction.atomic():
+                    VideoStatsDay.objects.bulk_create(rows, batch_size=1000)
+
+            def scan_naive():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT video_id, sampled_at, views, likes, comments FROM bench_video_stats_sample "
+                        "ORDER BY video_id, sampled_at")
+                    for row in cursor.fetchall():
+                        connection.ops.convert_datetimefield_value(row[1], None, connection)
+
+            def closes_naive():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT video_id, date(sampled_at), MAX(views), MAX(likes), MAX(comments) "
+                        "FROM bench_video_stats_sample GROUP BY video_id, date(sampled_at)")
+                    cursor.fetchall()
+
+            results = {
+                'rows': {
+                    'write': timed(write_naive),
+                    'scan': timed(scan_naive),
+                    'closes': timed(closes_naive),
+                    'rows': sum(len(samples) for samples in series.values()),
+                    'bytes': table_bytes('bench_video_stats_sample', 'bench_video_stats_sample_idx'),
+                },
+                'packed': {
+                    'write': timed(write_packed),
+                    'scan': timed(lambda: video_histories(video_ids, first, last)),
+                    'closes': timed(lambda: daily_closes(video_ids, first, last)),
+                    'rows': VideoStatsDay.objects.count(),
+                    'bytes': table_bytes(VideoStatsDay._meta.db_table,
+                                         *self.index_names(VideoStatsDay._meta.db_table)),
+                },
+            }
+        samples = sum(len(s) for s in series.values())
+        self.stdout.write(f"{options['videos']} videos x {options['days']} days x "
+                          f"{options['samples_per_day']} samples/day = {samples} samples")
+        self.stdout.write(f"{'layout':<8} {'rows':>9} {'MiB':>8} {'B/sample':>9} "
+                          f"{'write s':>8} {'scan s':>8} {'closes s':>9}")
+        for layout, r in results.items():
+            self.stdout.write(
+                f"{layout:<8} {r['rows']:>9} {r['bytes'] / 2 ** 20:>8.2f} {r['bytes'] / samples:>9.1f} "
+                f"{r['write']:>8.2f} {r['scan']:>8.2f} {r['closes']:>9.2f}")
+
+    def index_names(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s",
+                           [table])
+            return [name for name, in cursor.fetchall()]
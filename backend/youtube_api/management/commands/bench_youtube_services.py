@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from youtube_api.services import authorized_http, get_service
+
+
+class Command(BaseCommand):
+    help = "Compare per-request service setup: build() vs the cached service factory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        credentials = Credentials('benchmark-token')
+
+        def naive():
+            youtube = build('youtube', 'v3', credentials=credentials)
+            analytics = build('youtubeAnalytics', 'v2', credentials=credentials)
+            youtube.channels().list(part="snippet", mine=True)
+            analytics.reports().query(ids='channel==MINE', startDate='2025-01-01',
+                                      endDate='2025-01-30', metrics='views')
+
+        def cached():
+            youtube = get_service('youtube', 'v3')
+            analytics = get_service('youtubeAnalytics', 'v2')
+            authorized_http(credentials)
+            youtube.channels().list(part="snippet", mine=True)
+            analytics.reports().query(ids='channel==MINE', startDate='2025-01-01',
+                                      endDate='2025-01-30', metrics='views')
+
+        cached()  # warm the process-wide cache, as the first request would
+        for name, setup in (('build()', naive), ('service factory', cached)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                setup()
+            per_request = (time.perf_counter() - started) / iterations * 1000
+            self.stdout.write(f"{name:>16}: {per_request:8.3f} ms per request")
@@ -0,0 +1,27 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from youtube_api.stats import refresh_all_stats
+
+
+class Command(BaseCommand):
+    help = "Refresh stored YouTube stats for every connected user."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=settings.YOUTUBE_STATS_REFRESH_INTERVAL,
+            help="Seconds between refresh passes and the snapshot age that triggers a refresh.")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Run a single refresh pass and exit.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            started = time.monotonic()
+            refreshed, failed, deferred = refresh_all_stats(max_age=interval)
+            self.stdout.write(
+                f"Refreshed {refreshed} channel(s), {failed} failed, {deferred} deferred.")
+            if options['once']:
+                return
+            time.sleep(max(0, interval - (time.monotonic() - started)))
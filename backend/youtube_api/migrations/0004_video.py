@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube_api', '0003_channeldailymetrics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='youtubestats',
+            name='top_videos',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='youtubestats',
+            name='uploads_backfill_token',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.CreateModel(
+            name='Video',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel_id', models.CharField(max_length=64)),
+                ('video_id', models.CharField(max_length=32)),
+                ('title', models.CharField(blank=True, default='', max_length=255)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('views', models.BigIntegerField(default=0)),
+                ('likes', models.BigIntegerField(default=0)),
+                ('comments', models.BigIntegerField(default=0)),
+                ('stats_refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'channel_id', 'published_at'], name='youtube_api_user_id_d7eab8_idx'), models.Index(fields=['user', 'channel_id', 'views'], name='youtube_api_user_id_79405d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'video_id'), name='unique_user_video')],
+            },
+        ),
+    ]
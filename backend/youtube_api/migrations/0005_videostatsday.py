@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube_api', '0004_video'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoStatsDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('samples', models.BinaryField()),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_days', to='youtube_api.video')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('video', 'date'), name='unique_video_stats_day')],
+            },
+        ),
+    ]
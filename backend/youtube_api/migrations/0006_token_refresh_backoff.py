@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube_api', '0005_videostatsday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='youtubecredentials',
+            name='refresh_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='youtubecredentials',
+            name='refresh_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -13,6 +13,9 @@ class YouTubeCredentials(models.Model):
     token_expiry = models.DateTimeField(null=True, blank=True)
     # Store the granted scopes
     scopes = models.TextField(null=True, blank=True)
+    # Failed background refreshes in a row, and when the next may be tried
+    refresh_failures = models.PositiveIntegerField(default=0)
+    refresh_retry_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username}'s YouTube Credentials"
@@ -21,3 +24,116 @@ class YouTubeCredentials(models.Model):
     def is_valid(self):
         from django.utils import timezone
         return self.access_token and self.token_expiry and self.token_expiry > timezone.now()
+
+
+class YouTubeStats(models.Model):
+    """Latest channel snapshot, written by the background refresher."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    channel_id = models.CharField(max_length=64, blank=True, default="")
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default="")
+    subscribers = models.BigIntegerField(default=0)
+    views = models.BigIntegerField(default=0)
+    video_count = models.IntegerField(default=0)
+    videos = models.JSONField(default=list)
+    top_videos = models.JSONField(default=list)
+    trends = models.JSONField(default=dict)
+    # Where paging the uploads playlist stopped, for channels too big for one refresh
+    uploads_backfill_token = models.CharField(max_length=128, blank=True, default="")
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user.username}'s YouTube stats at {self.refreshed_at}"
+
+    def as_payload(self):
+        return {
+            "channel": {
+                "title": self.title,
+                "subscribers": self.subscribers,
+                "views": self.views,
+                "videoCount": self.video_count,
+                "description": self.description,
+            },
+            "videos": self.videos,
+            "top_videos": self.top_videos,
+            "trends": self.trends,
+            "last_refreshed": self.refreshed_at.isoformat(),
+        }
+
+
+class ChannelDailyMetrics(models.Model):
+    """One Analytics report row per channel and day.
+
+    Days older than ``YOUTUBE_ANALYTICS_SETTLE_DAYS`` no longer change and
+    are never queried again.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    channel_id = models.CharField(max_length=64)
+    date = models.DateField()
+    subscribers_gained = models.IntegerField(default=0)
+    views = models.BigIntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'channel_id', 'date'],
+                                    name='unique_user_channel_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel_id} on {self.date}"
+
+
+class Video(models.Model):
+    """An upload of the user's channel with its latest statistics."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    channel_id = models.CharField(max_length=64)
+    video_id = models.CharField(max_length=32)
+    title = models.CharField(max_length=255, blank=True, default="")
+    published_at = models.DateTimeField(null=True, blank=True)
+    views = models.BigIntegerField(default=0)
+    likes = models.BigIntegerField(default=0)
+    comments = models.BigIntegerField(default=0)
+    stats_refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video_id'], name='unique_user_video'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'channel_id', 'published_at']),
+            models.Index(fields=['user', 'channel_id', 'views']),
+        ]
+
+    def __str__(self):
+        return self.title or self.video_id
+
+    def as_payload(self):
+        return {
+            "id": self.video_id,
+            "title": self.title,
+            "published_at": self.published_at.isoformat() if self.published_at else None,
+            "views": self.views,
+            "likes": self.likes,
+            "comments": self.comments,
+            "engagement": self.likes + self.comments,
+        }
+
+
+class VideoStatsDay(models.Model):
+    """A video's statistics samples for one UTC day, packed by ``youtube_api.history``."""
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='stats_days')
+    date = models.DateField()
+    samples = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'date'], name='unique_video_stats_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.video} on {self.date}"
@@ -0,0 +1,101 @@
+import json
+import time
+from functools import lru_cache
+from urllib.parse import urlparse
+import httplib2
+import httpx
+from django.conf import settings
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from api import circuit
+from api.asynchttp import get_client
+from api.metrics import observe_upstream
+
+
+@lru_cache(maxsize=settings.YOUTUBE_SERVICE_CACHE_SIZE)
+def discovery_document(service_name, version):
+    """Parsed discovery document bundled with googleapiclient."""
+    doc = get_static_doc(service_name, version)
+    if doc is None:
+        raise ValueError(f"No static discovery document for {service_name} {version}.")
+    return json.loads(doc)
+
+
+@lru_cache(maxsize=settings.YOUTUBE_SERVICE_CACHE_SIZE)
+def get_service(service_name, version):
+    """Process-wide service skeleton, built once per API and version.
+
+    The skeleton carries no credentials: bind a user by passing
+    ``http=authorized_http(credentials)`` to each request's ``execute()``.
+    """
+    api_endpoint = settings.YOUTUBE_API_ENDPOINTS.get(service_name)
+    return build_from_document(
+        discovery_document(service_name, version), http=httplib2.Http(),
+        client_options={'api_endpoint': api_endpoint} if api_endpoint else None)
+
+
+class InstrumentedHttp(AuthorizedHttp):
+    """``AuthorizedHttp`` that times every Google API call and guards it with a circuit breaker."""
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        endpoint = urlparse(uri).path
+        circuit.before_call('google', endpoint)
+        started = time.perf_counter()
+        try:
+            response, content = super().request(uri, method, *args, **kwargs)
+        except Exception:
+            _record(endpoint, 'error', started)
+            raise
+        _record(endpoint, response.status, started)
+        return response, content
+
+
+def _record(endpoint, status, started):
+    observe_upstream('google', endpoint, status, time.perf_counter() - started)
+    if status == 'error' or status >= 500:
+        circuit.record_failure('google', endpoint)
+    else:
+        circuit.record_success('google', endpoint)
+
+
+async def _arecord(endpoint, status, started):
+    observe_upstream('google', endpoint, status, time.perf_counter() - started)
+    if status == 'error' or status >= 500:
+        await circuit.arecord_failure('google', endpoint)
+    else:
+        await circuit.arecord_success('google', endpoint)
+
+
+def authorized_http(credentials, timeout=None):
+    """Cheap per-user transport for requests built from a shared skeleton."""
+    if timeout is None:
+        timeout = settings.YOUTUBE_STATS_DEADLINE
+    return InstrumentedHttp(credentials, http=httplib2.Http(timeout=timeout))
+
+
+async def async_execute(http_request, credentials):
+    """Send a request built from a service skeleton over httpx; returns the decoded body.
+
+    ``credentials`` must hold a valid access token (see ``credentials_for``).
+    Error statuses raise ``HttpError`` like ``HttpRequest.execute()`` does.
+    """
+    headers = dict(http_request.headers)
+    credentials.apply(headers)
+    endpoint = urlparse(http_request.uri).path
+    await circuit.abefore_call('google', endpoint)
+    client = get_client('google', timeout=settings.YOUTUBE_STATS_DEADLINE,
+                        limits=httpx.Limits(max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS))
+    started = time.perf_counter()
+    try:
+        response = await client.request(http_request.method, http_request.uri,
+                                        headers=headers, content=http_request.body)
+    except httpx.HTTPError:
+        await _arecord(endpoint, 'error', started)
+        raise
+    await _arecord(endpoint, response.status_code, started)
+    if response.status_code >= 400:
+        raise HttpError(httplib2.Response({'status': response.status_code}),
+                        response.content, uri=http_request.uri)
+    return response.json()
@@ -0,0 +1,440 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from api import singleflight, swr
+from api.conditional import make_etag
+from api.quota import BACKGROUND, INTERACTIVE, QuotaExceeded, acharge, charge
+from api.summary import update_summary
+from .history import record_samples
+from .models import ChannelDailyMetrics, Video, YouTubeCredentials, YouTubeStats
+from .services import async_execute, authorized_http, get_service
+from .tokens import credentials_for
+
+logger = logging.getLogger(__name__)
+
+# Bounded pool shared by all requests for the independent upstream calls
+_executor = ThreadPoolExecutor(
+    max_workers=settings.YOUTUBE_FETCH_WORKERS, thread_name_prefix='youtube-fetch')
+
+
+def channels_request(youtube):
+    return youtube.channels().list(part="snippet,statistics,contentDetails", mine=True)
+
+
+def uploads_request(youtube, channel, page_token=None):
+    return youtube.playlistItems().list(
+        part="contentDetails",
+        playlistId=channel["contentDetails"]["relatedPlaylists"]["uploads"],
+        maxResults=50,
+        pageToken=page_token,
+    )
+
+
+def videos_request(youtube, video_ids):
+    return youtube.videos().list(part="snippet,statistics", id=",".join(video_ids))
+
+
+def report_request(analytics, start_date, end_date):
+    return analytics.reports().query(
+        ids='channel==MINE',
+        startDate=start_date.isoformat(),
+        endDate=end_date.isoformat(),
+        metrics='subscribersGained,views,likes,comments',
+        dimensions='day',
+        sort='day',
+    )
+
+
+def report_rows(response):
+    return {date.fromisoformat(row[0]): [int(value) for value in row[1:5]]
+            for row in response.get("rows", [])}
+
+
+def report_window(user_id, days=None):
+    """``(start, end)`` of the Analytics days still to query for the user's channel.
+
+    Settled days already in the store are skipped, so after the first fetch
+    only the last ``YOUTUBE_ANALYTICS_SETTLE_DAYS`` days are queried.
+    """
+    days = settings.YOUTUBE_TREND_DAYS if days is None else days
+    end = datetime.now(dt_timezone.utc).date()
+    start = end - timedelta(days=days - 1)
+    channel_id = YouTubeStats.objects.filter(
+        user_id=user_id).values_list('channel_id', flat=True).first()
+    if not channel_id:
+        return start, end
+    settled = end - timedelta(days=settings.YOUTUBE_ANALYTICS_SETTLE_DAYS)
+    stored = set(ChannelDailyMetrics.objects.filter(
+        user_id=user_id, channel_id=channel_id, date__range=(start, settled),
+    ).values_list('date', flat=True))
+    while start <= settled and start in stored:
+        start += timedelta(days=1)
+    return start, end
+
+
+def store_report(user_id, channel_id, report):
+    """Upsert the report's rows; settled days it has no row for are stored as zeros."""
+    rows = dict(report["rows"])
+    settled = report["end"] - timedelta(days=settings.YOUTUBE_ANALYTICS_SETTLE_DAYS)
+    day = report["start"]
+    while day <= settled:
+        rows.setdefault(day, [0, 0, 0, 0])
+        day += timedelta(days=1)
+    ChannelDailyMetrics.objects.bulk_create(
+        [ChannelDailyMetrics(user_id=user_id, channel_id=channel_id, date=day,
+                             subscribers_gained=subscribers, views=views,
+                             likes=likes, comments=comments)
+         for day, (subscribers, views, likes, comments) in rows.items()],
+        update_conflicts=True,
+        unique_fields=['user', 'channel_id', 'date'],
+        update_fields=['subscribers_gained', 'views', 'likes', 'comments'],
+    )
+
+
+def stored_trends(user_id, channel_id, days=None):
+    """Daily subscribers, views and engagement for the last ``days`` days, from the store."""
+    days = settings.YOUTUBE_TREND_DAYS if days is None else days
+    start = datetime.now(dt_timezone.utc).date() - timedelta(days=days - 1)
+    rows = ChannelDailyMetrics.objects.filter(
+        user_id=user_id, channel_id=channel_id, date__gte=start).order_by('date')
+    return {
+        "subscribers": [{"date": row.date.isoformat(), "value": row.subscribers_gained}
+                        for row in rows],
+        "views": [{"date": row.date.isoformat(), "value": row.views} for row in rows],
+        "engagement": [{"date": row.date.isoformat(), "value": row.likes + row.comments}
+                       for row in rows],
+    }
+
+
+def video_sync_plan(user_id):
+    """What the next fetch needs to know about the uploads stored for the user's channel.
+
+    ``due`` lists the stored videos whose statistics are refreshed: every
+    upload younger than ``YOUTUBE_VIDEO_REFRESH_DAYS``, plus the
+    ``YOUTUBE_VIDEO_REFRESH_BATCH`` older ones refreshed longest ago.
+    """
+    snapshot = YouTubeStats.objects.filter(user_id=user_id).values(
+        'channel_id', 'uploads_backfill_token').first()
+    if not snapshot or not snapshot['channel_id']:
+        return new_channel_plan()
+    videos = Video.objects.filter(user_id=user_id, channel_id=snapshot['channel_id'])
+    since = timezone.now() - timedelta(days=settings.YOUTUBE_VIDEO_REFRESH_DAYS)
+    due = list(videos.filter(published_at__gte=since).values_list('video_id', flat=True))
+    due += videos.exclude(published_at__gte=since).order_by(
+        F('stats_refreshed_at').asc(nulls_first=True),
+    ).values_list('video_id', flat=True)[:settings.YOUTUBE_VIDEO_REFRESH_BATCH]
+    return {"channel_id": snapshot['channel_id'],
+            "known": set(videos.values_list('video_id', flat=True)),
+            "due": due,
+            "backfill_token": snapshot['uploads_backfill_token']}
+
+
+def new_channel_plan(channel_id=None):
+    return {"channel_id": channel_id, "known": set(), "due": [], "backfill_token": ""}
+
+
+def upload_pages(youtube, channel, plan):
+    """Uploads playlist page requests; send each response back in.
+
+    Pages newest first until it reaches a known video, then resumes an
+    unfinished backfill of older uploads, reading at most
+    ``YOUTUBE_UPLOADS_MAX_PAGES`` pages in all. Returns the new video ids
+    and the page token to resume the backfill from next time.
+    """
+    budget = settings.YOUTUBE_UPLOADS_MAX_PAGES
+    seen, video_ids, token = set(plan["known"]), [], None
+    while budget:
+        response = yield uploads_request(youtube, channel, token)
+        budget -= 1
+        ids = [item["contentDetails"]["videoId"] for item in response["items"]]
+        new = [video_id for video_id in ids if video_id not in seen]
+        seen.update(new)
+        video_ids += new
+        token = response.get("nextPageToken")
+        if len(new) < len(ids) or not token:
+            break
+    else:
+        # More new uploads than one refresh reads: carry on from here next time
+        return video_ids, token
+    token = plan["backfill_token"]
+    while token and budget:
+        response = yield uploads_request(youtube, channel, token)
+        budget -= 1
+        new = [item["contentDetails"]["videoId"] for item in response["items"]
+               if item["contentDetails"]["videoId"] not in seen]
+        seen.update(new)
+        video_ids += new
+        token = response.get("nextPageToken")
+    return video_ids, token or ""
+
+
+def stats_batches(new_ids, plan):
+    """New uploads first, then the due ones, in ``videos.list`` batches of 50 ids."""
+    new = set(new_ids)
+    video_ids = new_ids + [video_id for video_id in plan["due"] if video_id not in new]
+    return [video_ids[i:i + 50] for i in range(0, len(video_ids), 50)]
+
+
+def channel_calls(youtube, plan):
+    """Channel statistics, new uploads and the video statistics due (dependent chain).
+
+    Yields each Data API request; send its response back in. Shared by the
+    sync and async fetches, which charge and execute the requests.
+    """
+    channel = (yield channels_request(youtube))["items"][0]
+    if channel["id"] != plan["channel_id"]:
+        plan = new_channel_plan(channel["id"])
+    new_ids, backfill_token = yield from upload_pages(youtube, channel, plan)
+    requested, items = [], []
+    for video_ids in stats_batches(new_ids, plan):
+        items += (yield videos_request(youtube, video_ids))["items"]
+        requested += video_ids
+    return channel, {"requested": requested, "items": items, "backfill_token": backfill_token}
+
+
+def report_calls(analytics, window):
+    """Daily subscribers, views, likes and comments for ``window`` in a single report."""
+    start, end = window
+    response = yield report_request(analytics, start, end)
+    return {"start": start, "end": end, "rows": report_rows(response)}
+
+
+def execute_calls(calls, api, http, user_id, priority=INTERACTIVE):
+    """Run a ``*_calls`` generator, charging ``api`` for every request it yields."""
+    response = None
+    try:
+        while True:
+            request = calls.send(response)
+            charge(api, user_id, priority=priority)
+            response = request.execute(http=http)
+    except StopIteration as done:
+        return done.value
+
+
+def video_row(item):
+    statistics = item.get("statistics", {})
+    return {
+        "video_id": item["id"],
+        "title": item["snippet"]["title"],
+        "published_at": parse_datetime(item["snippet"]["publishedAt"]),
+        "views": int(statistics.get("viewCount", 0)),
+        "likes": int(statistics.get("likeCount", 0)),
+        "comments": int(statistics.get("commentCount", 0)),
+    }
+
+
+def build_payload(channel, uploads, report):
+    stats = channel["statistics"]
+    snippet = channel["snippet"]
+
+    return {
+        "channel_id": channel["id"],
+        "channel": {
+            "title": snippet["title"],
+            "subscribers": int(stats.get("subscriberCount", 0)),
+            "views": int(stats.get("viewCount", 0)),
+            "videoCount": int(stats.get("videoCount", 0)),
+            "description": snippet.get("description", ""),
+        },
+        "uploads": {
+            "requested": uploads["requested"],
+            "videos": [video_row(item) for item in uploads["items"]],
+            "backfill_token": uploads["backfill_token"],
+        },
+        "report": report,
+    }
+
+
+def fetch_channel_stats(creds, priority=INTERACTIVE):
+    """Query the Data and Analytics APIs concurrently and return the stats payload.
+
+    The channel -> uploads -> videos chain and the analytics report do not
+    depend on each other, so they run side by side on the shared pool. Both
+    only ask for what the local tables lack: new uploads, statistics that
+    are due and the Analytics days not settled yet.
+    Each branch gets its own ``Http`` because httplib2 is not thread-safe.
+    Raises ``TimeoutError`` once ``YOUTUBE_STATS_DEADLINE`` seconds have
+    passed, and ``QuotaExceeded`` when a call does not fit the budget for
+    ``priority``.
+    """
+    credentials = credentials_for(creds)
+    youtube = get_service('youtube', 'v3')
+    analytics = get_service('youtubeAnalytics', 'v2')
+    plan = video_sync_plan(creds.user_id)
+    window = report_window(creds.user_id)
+
+    channel_future = _executor.submit(
+        execute_calls, channel_calls(youtube, plan), 'youtube',
+        authorized_http(credentials), creds.user_id, priority)
+    report_future = _executor.submit(
+        execute_calls, report_calls(analytics, window), 'youtubeAnalytics',
+        authorized_http(credentials), creds.user_id, priority)
+    done, pending = wait([channel_future, report_future],
+                         timeout=settings.YOUTUBE_STATS_DEADLINE)
+    if pending:
+        for future in pending:
+            future.cancel()
+        raise TimeoutError("YouTube stats fetch exceeded its deadline.")
+
+    channel, uploads = channel_future.result()
+    return build_payload(channel, uploads, report_future.result())
+
+
+async def async_execute_calls(calls, api, credentials, user_id, priority=INTERACTIVE):
+    """``execute_calls`` for async views, sending the requests over httpx."""
+    response = None
+    try:
+        while True:
+            request = calls.send(response)
+            await acharge(api, user_id, priority=priority)
+            response = await async_execute(request, credentials)
+    except StopIteration as done:
+        return done.value
+
+
+async def async_fetch_channel_stats(creds, priority=INTERACTIVE):
+    """``fetch_channel_stats`` for async views: both branches run on the event loop."""
+    credentials = await sync_to_async(credentials_for)(creds)
+    youtube = get_service('youtube', 'v3')
+    analytics = get_service('youtubeAnalytics', 'v2')
+    plan = await sync_to_async(video_sync_plan)(creds.user_id)
+    window = await sync_to_async(report_window)(creds.user_id)
+    try:
+        (channel, uploads), report = await asyncio.wait_for(asyncio.gather(
+            async_execute_calls(channel_calls(youtube, plan), 'youtube',
+                                credentials, creds.user_id, priority),
+            async_execute_calls(report_calls(analytics, window), 'youtubeAnalytics',
+                                credentials, creds.user_id, priority),
+        ), timeout=settings.YOUTUBE_STATS_DEADLINE)
+    except asyncio.TimeoutError:
+        raise TimeoutError("YouTube stats fetch exceeded its deadline.")
+    return build_payload(channel, uploads, report)
+
+
+def store_videos(user_id, channel_id, uploads):
+    """Upsert the fetched videos and add their statistics to the history.
+
+    Requested videos that YouTube no longer returns were deleted.
+    """
+    now = timezone.now()
+    Video.objects.bulk_create(
+        [Video(user_id=user_id, channel_id=channel_id, stats_refreshed_at=now, **row)
+         for row in uploads["videos"]],
+        update_conflicts=True,
+        unique_fields=['user', 'video_id'],
+        update_fields=['channel_id', 'title', 'published_at', 'views', 'likes', 'comments',
+                       'stats_refreshed_at'],
+    )
+    returned = {row["video_id"] for row in uploads["videos"]}
+    record_samples(list(Video.objects.filter(user_id=user_id, video_id__in=returned).values_list(
+        'pk', 'views', 'likes', 'comments')), at=now)
+    gone = [video_id for video_id in uploads["requested"] if video_id not in returned]
+    if gone:
+        Video.objects.filter(user_id=user_id, video_id__in=gone).delete()
+
+
+def store_snapshot(user_id, payload):
+    """Persist a fetched payload as the user's snapshot and update the summary.
+
+    Recent and top videos and the like and comment totals come from the
+    whole local video table, not just what this fetch returned.
+    """
+    channel = payload["channel"]
+    channel_id = payload["channel_id"]
+    store_report(user_id, channel_id, payload["report"])
+    store_videos(user_id, channel_id, payload["uploads"])
+    videos = Video.objects.filter(user_id=user_id, channel_id=channel_id)
+    totals = videos.aggregate(likes=Sum('likes'), comments=Sum('comments'))
+    snapshot, _ = YouTubeStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            "channel_id": channel_id,
+            "title": channel["title"],
+            "description": channel["description"],
+            "subscribers": channel["subscribers"],
+            "views": channel["views"],
+            "video_count": channel["videoCount"],
+            "videos": [video.as_payload() for video in videos.order_by(
+                F('published_at').desc(nulls_last=True))[:5]],
+            "top_videos": [video.as_payload() for video in videos.order_by('-views')[:5]],
+            "uploads_backfill_token": payload["uploads"]["backfill_token"],
+            "trends": stored_trends(user_id, channel_id),
+            "refreshed_at": timezone.now(),
+        }
+    )
+    update_summary(
+        user_id,
+        youtube_subscribers=snapshot.subscribers,
+        youtube_views=snapshot.views,
+        youtube_likes=totals['likes'] or 0,
+        youtube_comments=totals['comments'] or 0,
+        youtube_refreshed_at=snapshot.refreshed_at,
+    )
+    cache_snapshot(snapshot)
+    return snapshot
+
+
+def refresh_user_stats(creds, priority=INTERACTIVE):
+    """Fetch fresh stats for one connected user and store the snapshot."""
+    return store_snapshot(creds.user_id, fetch_channel_stats(creds, priority))
+
+
+async def async_refresh_user_stats(creds, priority=INTERACTIVE):
+    payload = await async_fetch_channel_stats(creds, priority)
+    return await sync_to_async(store_snapshot)(creds.user_id, payload)
+
+
+def stats_etag(user_id, refreshed_at):
+    return make_etag('youtube-stats', user_id, refreshed_at.timestamp())
+
+
+def snapshot_entry(snapshot):
+    return {'payload': snapshot.as_payload(),
+            'etag': stats_etag(snapshot.user_id, snapshot.refreshed_at),
+            'last_modified': snapshot.refreshed_at}
+
+
+def cache_snapshot(snapshot):
+    """Store the snapshot's payload in the response cache."""
+    return swr.store('youtube', snapshot.user_id, **snapshot_entry(snapshot))
+
+
+def revalidate(user_id):
+    """Background rebuild of the cached payload, refreshing first if the snapshot is due."""
+    snapshot = YouTubeStats.objects.filter(user_id=user_id).first()
+    due = timezone.now() - timedelta(seconds=settings.YOUTUBE_STATS_REFRESH_INTERVAL)
+    if snapshot is None or snapshot.refreshed_at < due:
+        creds = YouTubeCredentials.objects.select_related('user').get(user_id=user_id)
+        snapshot = singleflight.do(
+            ('youtube', 'stats', user_id), lambda: refresh_user_stats(creds, priority=BACKGROUND),
+            reload=lambda: YouTubeStats.objects.filter(user_id=user_id, refreshed_at__gte=due).first())
+    return cache_snapshot(snapshot)
+
+
+def refresh_all_stats(max_age=None):
+    """Refresh every connected user whose snapshot is older than ``max_age`` seconds.
+
+    Users whose quota is running low are deferred to a later pass.
+    """
+    refreshed, failed, deferred = 0, 0, 0
+    pending = YouTubeCredentials.objects.select_related('user')
+    if max_age:
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        pending = pending.exclude(user__youtubestats__refreshed_at__gt=cutoff)
+    for creds in pending:
+        try:
+            refresh_user_stats(creds, priority=BACKGROUND)
+            refreshed += 1
+        except QuotaExceeded as e:
+            deferred += 1
+            logger.info(f'[refresh_all_stats] Deferred user {creds.user}: {e}')
+        except Exception as e:
+            failed += 1
+            logger.error(f'[refresh_all_stats] Failed for user {creds.user}: {e}', exc_info=True)
+    return refreshed, failed, deferred
@@ -1,3 +1,142 @@
-from django.test import TestCase
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone as dj_timezone
+from .history import decode, encode, record_samples, video_histories
+from .models import ChannelDailyMetrics, Video, VideoStatsDay, YouTubeStats
+from .stats import (
+    async_execute_calls, channel_calls, execute_calls, report_window, store_report, store_videos,
+    stored_trends, upload_pages,
+)
 
-# Create your tests here.
+
+@override_settings(YOUTUBE_TREND_DAYS=30, YOUTUBE_ANALYTICS_SETTLE_DAYS=3)
+class ChannelDailyMetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='creator')
+        self.today = datetime.now(timezone.utc).date()
+
+    def test_settled_days_are_not_queried_again(self):
+        start = self.today - timedelta(days=29)
+        self.assertEqual(report_window(self.user.id), (start, self.today))
+        # The report has no row for one settled day: it is still final
+        rows = {start + timedelta(days=i): [1, 10 * i, 2, 3] for i in range(30) if i != 5}
+        store_report(self.user.id, 'UC1', {"start": start, "end": self.today, "rows": rows})
+        YouTubeStats.objects.create(user=self.user, channel_id='UC1', title='Channel',
+                                    refreshed_at=dj_timezone.now())
+        self.assertEqual(report_window(self.user.id), (self.today - timedelta(days=2), self.today))
+        self.assertEqual(ChannelDailyMetrics.objects.count(), 30)
+
+    def test_trends_are_assembled_from_the_store(self):
+        day = self.today - timedelta(days=10)
+        store_report(self.user.id, 'UC1', {"start": day, "end": day, "rows": {day: [4, 100, 7, 2]}})
+        trends = stored_trends(self.user.id, 'UC1')
+        self.assertEqual(trends["subscribers"], [{"date": day.isoformat(), "value": 4}])
+        self.assertEqual(trends["views"], [{"date": day.isoformat(), "value": 100}])
+        self.assertEqual(trends["engagement"], [{"date": day.isoformat(), "value": 9}])
+        self.assertEqual(stored_trends(self.user.id, 'UC2')["views"], [])
+
+
+@override_settings(YOUTUBE_UPLOADS_MAX_PAGES=2)
+class UploadPagesTests(SimpleTestCase):
+    # Page token -> (video ids, next page token), newest uploads first
+    PAGES = {None: (['v5', 'v4'], '2'), '2': (['v3', 'v2'], '4'), '4': (['v1', 'v0'], None)}
+
+    def read_pages(self, known=(), backfill_token=''):
+        plan = {"channel_id": 'UC1', "known": set(known), "due": [], "backfill_token": backfill_token}
+        requested = []
+        with mock.patch('youtube_api.stats.uploads_request',
+                        side_effect=lambda youtube, channel, token: token):
+            pages = upload_pages(None, {}, plan)
+            try:
+                token = next(pages)
+                while True:
+                    requested.append(token)
+                    ids, next_token = self.PAGES[token]
+                    response = {"items": [{"contentDetails": {"videoId": i}} for i in ids]}
+                    if next_token:
+                        response["nextPageToken"] = next_token
+                    token = pages.send(response)
+            except StopIteration as done:
+                return requested, done.value
+
+    def test_first_sync_stops_at_page_budget_and_remembers_where(self):
+        self.assertEqual(self.read_pages(), ([None, '2'], (['v5', 'v4', 'v3', 'v2'], '4')))
+
+    def test_stops_at_known_videos_then_resumes_backfill(self):
+        self.assertEqual(self.read_pages(known={'v4', 'v3', 'v2'}, backfill_token='4'),
+                         ([None, '4'], (['v5', 'v1', 'v0'], '')))
+
+
+class ChannelCallsTests(SimpleTestCase):
+    """The sync and async fetches run the same chain of Data API calls."""
+
+    def youtube(self):
+        def request(response):
+            return mock.Mock(execute=mock.Mock(return_value=response))
+
+        youtube = mock.Mock()
+        youtube.channels().list.return_value = request({"items": [{
+            "id": 'UC1', "contentDetails": {"relatedPlaylists": {"uploads": 'UU1'}}}]})
+        youtube.playlistItems().list.return_value = request(
+            {"items": [{"contentDetails": {"videoId": 'v2'}}, {"contentDetails": {"videoId": 'v1'}}]})
+        youtube.videos().list.side_effect = lambda part, id: request(
+            {"items": [{"id": video_id} for video_id in id.split(',')]})
+        return youtube
+
+    def plan(self):
+        return {"channel_id": 'UC1', "known": {'v1'}, "due": ['v0'], "backfill_token": ''}
+
+    def test_sync_and_async_share_the_chain(self):
+        with mock.patch('youtube_api.stats.charge') as charge:
+            expected = execute_calls(channel_calls(self.youtube(), self.plan()), 'youtube', None, 1)
+        with mock.patch('youtube_api.stats.acharge') as acharge, \
+                mock.patch('youtube_api.stats.async_execute',
+                           new=mock.AsyncMock(side_effect=lambda request, credentials: request.execute())):
+            result = asyncio.run(async_execute_calls(
+                channel_calls(self.youtube(), self.plan()), 'youtube', None, 1))
+        self.assertEqual(result, expected)
+        channel, uploads = result
+        self.assertEqual(channel["id"], 'UC1')
+        self.assertEqual(uploads, {"requested": ['v2', 'v0'], "items": [{"id": 'v2'}, {"id": 'v0'}],
+                                   "backfill_token": ''})
+        # channels, one uploads page and one videos batch
+        self.assertEqual((charge.call_count, acharge.await_count), (3, 3))
+
+
+class StoreVideosTests(TestCase):
+    def test_upserts_and_drops_deleted_videos(self):
+        user = User.objects.create(username='creator')
+        Video.objects.create(user=user, channel_id='UC1', video_id='old', views=5)
+        Video.objects.create(user=user, channel_id='UC1', video_id='kept', views=5)
+        store_videos(user.id, 'UC1', {
+            "requested": ['old', 'kept', 'new'],
+            "videos": [{"video_id": 'kept', "title": 'Kept', "published_at": None,
+                        "views": 9, "likes": 1, "comments": 2},
+                       {"video_id": 'new', "title": 'New', "published_at": None,
+                        "views": 3, "likes": 0, "comments": 0}],
+        })
+        self.assertEqual(dict(Video.objects.values_list('video_id', 'views')), {'kept': 9, 'new': 3})
+
+
+class VideoHistoryTests(TestCase):
+    def test_encode_round_trip(self):
+        columns = ([60, 960, 1860], [10 ** 9, 10 ** 9 + 42, 10 ** 9 + 40], [7, 7, 9], [0, 1, 1])
+        self.assertEqual(decode(encode(columns)), tuple(list(column) for column in columns))
+
+    def test_samples_of_a_day_share_one_row(self):
+        user = User.objects.create(username='creator')
+        video = Video.objects.create(user=user, channel_id='UC1', video_id='v1')
+        morning = datetime(2026, 3, 1, 8, 0, tzinfo=timezone.utc)
+        record_samples([(video.pk, 100, 5, 1)], at=morning)
+        record_samples([(video.pk, 150, 6, 1)], at=morning + timedelta(hours=4))
+        record_samples([(video.pk, 180, 6, 2)], at=morning + timedelta(days=1))
+        self.assertEqual(VideoStatsDay.objects.count(), 2)
+        history = video_histories([video.pk], morning.date(), morning.date() + timedelta(days=1))
+        self.assertEqual(history[video.pk], [
+            (morning, 100, 5, 1),
+            (morning + timedelta(hours=4), 150, 6, 1),
+            (morning + timedelta(days=1), 180, 6, 2),
+        ])
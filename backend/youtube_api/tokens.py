@@ -0,0 +1,75 @@
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from api import oauth
+from .models import YouTubeCredentials
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+def build_credentials(creds):
+    expiry = None
+    if creds.token_expiry:
+        # google-auth compares expiry against naive UTC datetimes
+        expiry = creds.token_expiry.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return Credentials(
+        creds.access_token,
+        refresh_token=creds.refresh_token,
+        token_uri=TOKEN_URI,
+        client_id=settings.GOOGLE_OAUTH2_CLIENT_ID,
+        client_secret=settings.GOOGLE_OAUTH2_CLIENT_SECRET,
+        scopes=creds.scopes.split() if creds.scopes else None,
+        expiry=expiry,
+    )
+
+
+def expires_soon(creds, margin=None):
+    margin = settings.OAUTH_REFRESH_MARGIN if margin is None else margin
+    return creds.token_expiry is None or (
+        creds.token_expiry <= timezone.now() + timedelta(seconds=margin))
+
+
+def refresh_credentials(creds):
+    """Refresh the access token and persist it.
+
+    The write only applies if the stored token is still the one we
+    refreshed, so two refreshers racing each other cannot overwrite a
+    newer token with an older one. ``creds`` is updated in place.
+    """
+    credentials = build_credentials(creds)
+    credentials.refresh(Request())
+    expiry = credentials.expiry.replace(tzinfo=dt_timezone.utc) if credentials.expiry else None
+    updated = YouTubeCredentials.objects.filter(
+        pk=creds.pk, access_token=creds.access_token).update(
+            access_token=credentials.token,
+            refresh_token=credentials.refresh_token or creds.refresh_token,
+            token_expiry=expiry,
+            refresh_failures=0,
+            refresh_retry_at=None,
+    )
+    if updated:
+        creds.access_token = credentials.token
+        creds.refresh_token = credentials.refresh_token or creds.refresh_token
+        creds.token_expiry = expiry
+    else:
+        creds.refresh_from_db()
+    return creds
+
+
+def credentials_for(creds):
+    """Ready-to-use credentials for a request handler.
+
+    The background refresher normally renews tokens before they expire. A
+    token that is about to expire anyway is refreshed here as a fallback.
+    """
+    if creds.refresh_token and expires_soon(creds, margin=60):
+        refresh_credentials(creds)
+    return build_credentials(creds)
+
+
+def refresh_expiring(margin=None):
+    """Refresh every stored token that expires within ``margin`` seconds."""
+    return oauth.refresh_expiring(
+        YouTubeCredentials.objects.all(), 'token_expiry', refresh_credentials, 'YouTube', margin)
@@ -1,20 +1,26 @@
 # youtube_integration/views.py
 import jwt
-import random
 import logging
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.shortcuts import redirect
 from django.contrib.auth import get_user_model
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
-from googleapiclient.discovery import build
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from google_auth_oauthlib.flow import Flow
+from api import singleflight, swr
+from api.asyncview import AsyncAPIView
 from api.models import SocialAccount
-from .models import YouTubeCredentials
-from datetime import datetime, timedelta, timezone
-from rest_framework_simplejwt.tokens import RefreshToken    # added by Vishal
+from api.conditional import not_modified
+from api.quota import QuotaExceeded
+from api.summary import clear_platform
+from .models import ChannelDailyMetrics, Video, YouTubeCredentials, YouTubeStats
+from .stats import (
+    async_refresh_user_stats, cache_snapshot, revalidate, snapshot_entry, stats_etag,
+)
+from api.authentication import tokens_for_user    # added by Vishal
 
 User = get_user_model()
 logger = logging.getLogger(__name__)    # added by Vishal
@@ -94,17 +100,22 @@ class YouTubeAuthCallbackView(APIView):
                 'refresh_token': credentials.refresh_token,
                 'token_expiry': credentials.expiry,
                 'scopes': " ".join(credentials.scopes) if credentials.scopes else "",
+                'refresh_failures': 0,
+                'refresh_retry_at': None,
             }
         )
         if not user_creds.refresh_token and credentials.refresh_token:
             user_creds.refresh_token = credentials.refresh_token
             user_creds.save()
+        # Possibly a different channel: the next fetch queries the full trend range
+        YouTubeStats.objects.filter(user=user).update(channel_id='')
+        swr.invalidate('youtube', user.id)
         social_account, _ = SocialAccount.objects.get_or_create(user=user)
         if not social_account.youtube:
             social_account.youtube = True
             social_account.save()
         # Generate JWT tokens for the user (added by Vishal)
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
         # Redirect to frontend with tokens in query params
@@ -112,156 +123,59 @@ class YouTubeAuthCallbackView(APIView):
         return redirect(frontend_success_url)
 
 
-class YouTubeStatsView(APIView):
+class YouTubeStatsView(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        # Log the request details (added by Vishal)
-        logger.info('[YouTubeStatsView] Request received for YouTube stats.')
-        logger.info(f'[YouTubeStatsView] User: {request.user} Authenticated: {request.user.is_authenticated}')
-        logger.info(f'[YouTubeStatsView] Authorization header: {request.META.get("HTTP_AUTHORIZATION")}')
+    async def get(self, request):
+        entry, state = await swr.alookup('youtube', request.user.id)
+        if state == swr.STALE:
+            swr.revalidate('youtube', request.user.id, lambda: revalidate(request.user.id))
+        if entry is not None:
+            return swr.respond(request, entry)
+        # The snapshot timestamp is the version stamp: an unchanged snapshot
+        # is answered with a 304 before anything else is loaded.
+        version = await YouTubeStats.objects.filter(
+            user_id=request.user.id).values_list('refreshed_at', flat=True).afirst()
+        if version is not None:
+            cached = not_modified(request, stats_etag(request.user.id, version), version)
+            if cached is not None:
+                return cached
+        return await self.fetch(request)
+
+    async def post(self, request):
+        """Explicit refresh: drop the cached payload and query Google now."""
+        await swr.ainvalidate('youtube', request.user.id)
+        return await self.fetch(request, force=True)
+
+    async def fetch(self, request, force=False):
+        user_id = request.user.id
         try:
-            creds = YouTubeCredentials.objects.get(user=request.user)
-            # Log the credentials retrieval (added by Vishal)
-            logger.info(f'[YouTubeStatsView] Found YouTube credentials for user {request.user}.')
+            creds = await YouTubeCredentials.objects.aget(user_id=user_id)
         except YouTubeCredentials.DoesNotExist:
-            # Log the missing credentials (added by Vishal)
             logger.warning(f'[YouTubeStatsView] No YouTube credentials for user {request.user}.')
             return Response({'error': 'YouTube not connected'}, status=400)
-        try:
-            # Build credentials object for googleapiclient(added by Vishal)
-            from google.oauth2.credentials import Credentials
-            credentials = Credentials(
-                creds.access_token,
-                refresh_token=creds.refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=settings.GOOGLE_OAUTH2_CLIENT_ID,
-                client_secret=settings.GOOGLE_OAUTH2_CLIENT_SECRET,
-                scopes=creds.scopes.split()
-            )
-            youtube = build('youtube', 'v3', credentials=credentials)
-            analytics = build('youtubeAnalytics', 'v2', credentials=credentials)
-
-            # Get channel statistics(added by Vishal)
-            channels_response = youtube.channels().list(
-                part="snippet,statistics,contentDetails",
-                mine=True
-            ).execute()
-
-            channel = channels_response["items"][0] # added by Vishal
-            stats = channel["statistics"]
-            snippet = channel["snippet"]
-
-            # Example: Get video analytics (last 5 videos)(added by Vishal)
-            uploads_playlist_id = channel["contentDetails"]["relatedPlaylists"]["uploads"]
-            playlist_response = youtube.playlistItems().list(
-                part="snippet,contentDetails",
-                playlistId=uploads_playlist_id,
-                maxResults=5
-            ).execute()
-
-            video_ids = [item["contentDetails"]["videoId"]  # added by Vishal
-                         for item in playlist_response["items"]]
-            videos_response = youtube.videos().list(
-                part="snippet,statistics",
-                id=",".join(video_ids)
-            ).execute()
-
-            videos = [{ # added by Vishal
-                "title": v["snippet"]["title"],
-                "views": v["statistics"].get("viewCount"),
-                "likes": v["statistics"].get("likeCount"),
-                "comments": v["statistics"].get("commentCount"),
-            } for v in videos_response["items"]]
-
-            # --- REAL TRENDS DATA USING YOUTUBE ANALYTICS API ---(added by Vishal)
-            today = datetime.now(timezone.utc).date()
-            base_subs = int(stats.get("subscriberCount", 0))
-            base_views = int(stats.get("viewCount", 0))
-            end_date = datetime.now(timezone.utc).date()
-            start_date = end_date - timedelta(days=29)
-
-            # Subscribers trend(added by Vishal)
-            subs_response = analytics.reports().query(
-                ids='channel==MINE',
-                startDate=start_date.isoformat(),
-                endDate=end_date.isoformat(),
-                metrics='subscribersGained',
-                dimensions='day'
-            ).execute()
-
-            # Views trend(added by Vishal)
-            views_response = analytics.reports().query(
-                ids='channel==MINE',
-                startDate=start_date.isoformat(),
-                endDate=end_date.isoformat(),
-                metrics='views',
-                dimensions='day'
-            ).execute()
-
-            # Engagement trend (likes + comments)(added by Vishal)
-            engagement_response = analytics.reports().query(
-                ids='channel==MINE',
-                startDate=start_date.isoformat(),
-                endDate=end_date.isoformat(),
-                metrics='likes,comments',
-                dimensions='day'
-            ).execute()
-            # Helper to parse rows
-
-            def parse_trend(response, metric_index=1):# added by Vishal
-                return [
-                    {"date": row[0], "value": int(row[metric_index])}
-                    for row in response.get("rows", [])
-                ]
-
-            trends = { # added by Vishal
-                "subscribers": parse_trend(subs_response),
-                "views": parse_trend(views_response),
-                "engagement": [
-                    {
-                        "date": row[0],
-                        "value": int(row[1]) + int(row[2])
-                    }
-                    for row in engagement_response.get("rows", [])
-                ],
-            }
-
-            for i in range(30): # Simulate 30 days of data (added by Vishal)
-                date = today - timedelta(days=29 - i)
-                # Simulate daily growth
-                subs = base_subs + i * 5
-                views = base_views + i * 5
-                # Simulate engagement as likes + comments (random for demo)
-                engagement = random.randint(10, 100)
-
-                trends["subscribers"].append({ # added by Vishal
-                    "date": date.isoformat(),
-                    "value": subs
-                })
-                trends["views"].append({
-                    "date": date.isoformat(),
-                    "value": views
-                })
-                trends["engagement"].append({
-                    "date": date.isoformat(),
-                    "value": engagement
-                })
-
-            return Response({ # added by Vishal
-                "channel": {
-                    "title": snippet["title"],
-                    "subscribers": stats.get("subscriberCount"),
-                    "views": stats.get("viewCount"),
-                    "videoCount": stats.get("videoCount"),
-                    "description": snippet.get("description"),
-                },
-                "videos": videos,
-                "trends": trends
-            })
-        except Exception as e:
-            logger.error(f'[YouTubeStatsView] Exception during stats fetch: {e}', exc_info=True)
-            return Response({'error': f'Exception: {str(e)}'}, status=500)
+        # Stats are kept fresh by the refresh_youtube_stats command; only a
+        # freshly connected account without a snapshot is fetched inline.
+        snapshot = None if force else await YouTubeStats.objects.filter(user_id=user_id).afirst()
+        if snapshot is None:
+            try:
+                # Tabs opened together share one upstream fetch
+                snapshot = await singleflight.ado(
+                    ('youtube', 'stats', user_id), lambda: async_refresh_user_stats(creds),
+                    reload=lambda: YouTubeStats.objects.filter(user_id=user_id).afirst())
+            except QuotaExceeded as e:
+                return Response({'error': str(e)}, status=429,
+                                headers={'Retry-After': str(int(e.retry_after) + 1)})
+            except Exception as e:
+                logger.error(f'[YouTubeStatsView] Exception during stats fetch: {e}', exc_info=True)
+                # Upstream trouble: fall back to the last snapshot we stored
+                fallback = await YouTubeStats.objects.filter(user_id=user_id).afirst()
+                if fallback is not None:
+                    return swr.respond(request, snapshot_entry(fallback), stale=True)
+                retry_after = getattr(e, 'retry_after', settings.CIRCUIT_OPEN_SECONDS)
+                return Response({'error': 'YouTube is temporarily unavailable.'}, status=503,
+                                headers={'Retry-After': str(int(retry_after) + 1)})
+        return swr.respond(request, await sync_to_async(cache_snapshot)(snapshot))
 
 
 class YouTubeDisconnectView(APIView):
@@ -271,6 +185,11 @@ class YouTubeDisconnectView(APIView):
         user = request.user
         try:
             YouTubeCredentials.objects.filter(user=user).delete()
+            YouTubeStats.objects.filter(user=user).delete()
+            ChannelDailyMetrics.objects.filter(user=user).delete()
+            Video.objects.filter(user=user).delete()
+            clear_platform(user.id, 'youtube')
+            swr.invalidate('youtube', user.id)
             account = SocialAccount.objects.get(user=user)
             account.youtube = False
             account.save()